@@ -0,0 +1,87 @@
+# FAISS index types for rag.py
+#
+#   'flat'      exact brute-force scan (IndexFlatL2), the reference
+#   'ivf_flat'  inverted lists over nlist k-means cells, nprobe cells are scanned
+#   'ivf_pq'    as ivf_flat with vectors product-quantized to ann_pq_m bytes
+#   'hnsw'      graph search, efSearch candidates per query; no removals
+#
+# All types take caller supplied int64 ids (IVF natively, flat and HNSW through
+# IndexIDMap2). IVF types are trained on a random sample of the first vectors
+# added, so the cells fit the corpus of the first build; rag.py builds them again
+# once the corpus has grown ann_retrain_factor times. Too small a corpus for the
+# configured type gets a simpler one (ivf_pq -> ivf_flat -> flat). Saved indexes can be opened memory-mapped and read-only; with the IVF
+# types the inverted lists then stay in the page cache, shared by all processes,
+# instead of each reading them into RAM (faiss still copies flat and HNSW data).
+
+import math
+import numpy as np
+import faiss
+from   configs import *
+
+INDEX_TYPES = ['flat', 'ivf_flat', 'ivf_pq', 'hnsw']
+IVF_TYPES = ['ivf_flat', 'ivf_pq']
+# k-means needs 39 training points per IVF cell, PQ 256 (2^8 codes per sub-quantizer)
+IVF_MIN_POINTS = 39
+PQ_MIN_TRAIN = 256
+
+
+def auto_nlist(n_vectors):
+    # ~4 sqrt(n) cells, with at least 39 training points per cell (faiss' minimum)
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // IVF_MIN_POINTS))
+
+
+def fit_index_type(index_type, n_vectors, nlist=ann_nlist):
+    # the type make_index() builds for n_vectors: one that can be trained on that many (0: not known yet)
+    if n_vectors and index_type == 'ivf_pq' and n_vectors < PQ_MIN_TRAIN:
+        print(f"{n_vectors} vectors are too few to train ivf_pq (needs {PQ_MIN_TRAIN}), using ivf_flat.")
+        index_type = 'ivf_flat'
+    if n_vectors and index_type in IVF_TYPES and n_vectors < IVF_MIN_POINTS * (nlist or auto_nlist(n_vectors)):
+        print(f"{n_vectors} vectors are too few to train {nlist or auto_nlist(n_vectors)} IVF cells, using flat.")
+        index_type = 'flat'
+    return index_type
+
+
+def make_index(dimension, index_type=ann_index_type, n_vectors=0, nlist=ann_nlist, pq_m=ann_pq_m, hnsw_m=ann_hnsw_m):
+    # n_vectors: expected size, used to size nlist when it is not configured
+    index_type = fit_index_type(index_type, n_vectors, nlist)
+    if index_type == 'flat':
+        factory = 'IDMap2,Flat'
+    elif index_type == 'ivf_flat':
+        factory = f'IVF{nlist or auto_nlist(n_vectors)},Flat'
+    elif index_type == 'ivf_pq':
+        factory = f'IVF{nlist or auto_nlist(n_vectors)},PQ{pq_m}'
+    elif index_type == 'hnsw':
+        factory = f'IDMap2,HNSW{hnsw_m}'
+    else:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+    return faiss.index_factory(dimension, factory)
+
+
+def supports_removal(index_type):
+    return index_type != 'hnsw'
+
+
+def train_index(index, vectors, train_size=ann_train_size, seed=0):
+    # no-op for types that need no training
+    if index.is_trained:
+        return
+    if len(vectors) > train_size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), train_size, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+
+
+def tune_index(index, nprobe=ann_nprobe, ef_search=ann_ef_search):
+    # search-time knobs; each only applies to the index types that have it
+    params = faiss.ParameterSpace()
+    for name, value in (('nprobe', nprobe), ('efSearch', ef_search)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+    return index
+
+
+def read_index(index_file, mmap=False):
+    # mmap=True maps the file read-only: pages are loaded on demand and shared between processes
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    return tune_index(faiss.read_index(index_file, flags))
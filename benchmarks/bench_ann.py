@@ -0,0 +1,99 @@
+# Recall, queries/sec, file size and memory of the ann_index.py index types
+#
+# Synthetic clustered vectors of the embedding model's size (d=384, unit
+# length, as all-MiniLM-L6-v2 returns them), so no model is needed. Recall@k is
+# measured against the exact flat index. Every saved index is loaded both into
+# RAM and memory-mapped (ann_mmap), each time in a fresh process, and the private
+# (anonymous) memory that loading and searching it adds is reported; mapped pages
+# live in the page cache and are shared between processes.
+#
+# Usage: python benchmarks/bench_ann.py [--sizes 10000 100000 1000000] [--types flat ivf_flat ivf_pq hnsw]
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import faiss
+from   ann_index import INDEX_TYPES, make_index, read_index, train_index, tune_index
+
+
+def clustered_vectors(n, dimension, n_clusters, rng):
+    centers = rng.standard_normal((n_clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(n_clusters, size=n)] + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def private_mb():
+    # resident minus file-backed shared pages: what the process holds on its own
+    with open('/proc/self/statm') as f:
+        _, resident, shared = [int(field) for field in f.read().split()[:3]]
+    return (resident - shared) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def loaded_mb(index_file, mmap, queries, k):
+    # runs in a fresh process: the heap holds no memory freed by earlier indexes to reuse
+    before = private_mb()
+    index = read_index(index_file, mmap)
+    search_qps(index, queries, k)
+    return private_mb() - before
+
+
+def search_qps(index, queries, k):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return ids, len(queries) / (time.perf_counter() - start)
+
+
+def recall(ids, truth):
+    return np.mean([len(set(row) & set(true_row)) / len(true_row) for row, true_row in zip(ids, truth)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the FAISS index types")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--types', nargs='+', choices=INDEX_TYPES, default=INDEX_TYPES)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    folder = tempfile.mkdtemp()
+    print(f"{'vectors':>9}  {'type':<9}{'build s':>9}{'recall@' + str(args.k):>11}{'qps':>10}{'file MB':>9}"
+          f"{'load MB':>9}{'mmap MB':>9}")
+    for n in args.sizes:
+        vectors = clustered_vectors(n, args.dimension, max(10, n // 1000), rng)
+        queries = vectors[rng.choice(n, args.queries, replace=False)] + \
+            0.05 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+        ids = np.arange(n, dtype=np.int64)
+        truth = None
+        for index_type in ['flat'] + [t for t in args.types if t != 'flat']:
+            start = time.perf_counter()
+            index = make_index(args.dimension, index_type, n)
+            train_index(index, vectors)
+            index.add_with_ids(vectors, ids)
+            tune_index(index)
+            build_time = time.perf_counter() - start
+            found, qps = search_qps(index, queries, args.k)
+            if truth is None:
+                truth = found
+            index_file = os.path.join(folder, f'{index_type}.bin')
+            faiss.write_index(index, index_file)
+            del index
+
+            # private memory added by loading the file and searching it, in a new process each time
+            loaded = {}
+            for mmap in (False, True):
+                with multiprocessing.get_context('spawn').Pool(1) as pool:
+                    loaded[mmap] = pool.apply(loaded_mb, (index_file, mmap, queries, args.k))
+            if index_type in args.types:
+                print(f"{n:>9}  {index_type:<9}{build_time:>9.2f}{recall(found, truth):>11.3f}{qps:>10.0f}"
+                      f"{os.path.getsize(index_file) / 2 ** 20:>9.1f}{loaded[False]:>9.1f}{loaded[True]:>9.1f}")
+            os.remove(index_file)
+    os.rmdir(folder)
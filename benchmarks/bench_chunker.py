@@ -0,0 +1,79 @@
+# Corpus reduction and speed of the RAG chunker on a data/ folder
+#
+# Compares the old chunking (every .txt, raw and clean_ copies alike, cut into
+# 500-character slices with 100 characters of overlap per paragraph) with
+# rag.iter_chunks (one copy per paper, sentence-aligned token chunks, duplicates
+# dropped): files, chunks, tokens to embed and seconds. Without --data, a folder
+# is generated from articles.json the way save_pdfs.py lays it out: <paper>.txt
+# with paragraphs, clean_<paper>.txt collapsed to one line, and the same
+# license paragraph in every paper.
+#
+# Usage: python benchmarks/bench_chunker.py [--data data] [--papers 200]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from   prompt_budget import count_tokens
+from   rag import iter_chunks
+from   fixtures import load_articles
+
+LICENSE = ("This article is licensed under a Creative Commons Attribution 4.0 International License, which permits "
+           "use, sharing, adaptation, distribution and reproduction in any medium or format.")
+
+
+def make_corpus(folder, papers):
+    for i, article in enumerate(load_articles(papers)):
+        sentences = article['abstract'].split('. ')
+        paragraphs = [article['title'], LICENSE] + ['. '.join(sentences[j:j + 3]) for j in range(0, len(sentences), 3)]
+        text = '\n\n'.join(paragraphs) + '\n'
+        with open(os.path.join(folder, f'{i}.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+        with open(os.path.join(folder, f'clean_{i}.txt'), 'w', encoding='utf-8') as f:
+            f.write(' '.join(text.split()))
+
+
+def char_chunks(folder, chunk_size=500, overlap=100):
+    # the chunking rag.py used before chunker.py
+    for file in sorted(os.listdir(folder)):
+        if file.endswith('.txt'):
+            with open(os.path.join(folder, file), 'r', encoding='utf-8') as f:
+                for paragraph in f.read().split('\n\n'):
+                    cleaned_text = ' '.join(paragraph.split())
+                    for i in range(0, len(cleaned_text), chunk_size - overlap):
+                        yield file, cleaned_text[i:i + chunk_size]
+
+
+def measure(name, chunks):
+    start = time.perf_counter()
+    files, count, tokens = set(), 0, 0
+    for chunk in chunks:
+        files.add(chunk[0])
+        count += 1
+        tokens += count_tokens(chunk[-1])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34}{len(files):>7}{count:>9}{tokens:>10}{elapsed:>9.2f}")
+    return count, tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the old and the token-aware, deduplicating chunker")
+    parser.add_argument('--data', help='data folder to chunk, default: generated from articles.json')
+    parser.add_argument('--papers', type=int, default=200)
+    args = parser.parse_args()
+
+    folder = args.data
+    if folder is None:
+        folder = tempfile.mkdtemp()
+        make_corpus(folder, args.papers)
+
+    print(f"{'chunker':<34}{'files':>7}{'chunks':>9}{'tokens':>10}{'seconds':>9}")
+    old_chunks, old_tokens = measure('500 chars, all files', char_chunks(folder))
+    stats = {}
+    new_chunks, new_tokens = measure('tokens, one copy, deduplicated', iter_chunks(folder, stats=stats))
+    print(f"\n{stats.get('exact', 0)} exact and {stats.get('near', 0)} near duplicates dropped; "
+          f"{1 - new_chunks / old_chunks:.1%} fewer chunks, {1 - new_tokens / old_tokens:.1%} fewer tokens to embed")
@@ -0,0 +1,73 @@
+# Throughput and size of embeddings.EmbeddingCache on the abstracts in articles.json
+#
+# Encodes the abstracts (split into sentences-sized chunks and repeated to
+# --chunks) in-process and with a pool of worker processes, then re-runs the
+# cached case, and compares float16 / int8 storage with float32: file size and
+# recall@10 of an exact search over the stored vectors. Needs
+# sentence-transformers and downloads all-MiniLM-L6-v2 on first use.
+#
+# Usage: python benchmarks/bench_embeddings.py [--chunks 20000] [--workers 1 4] [--batch-size 64]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import faiss
+from   embeddings import DTYPES, EmbeddingCache, default_workers, embeddings_available
+from   fixtures import load_articles
+
+
+def corpus(n_chunks):
+    chunks = [sentence.strip() for article in load_articles() for sentence in article['abstract'].split('. ')
+              if sentence.strip()]
+    # repeats get a suffix, so they are new texts to the cache
+    return [chunks[i % len(chunks)] + (f' ({i // len(chunks)})' if i >= len(chunks) else '') for i in range(n_chunks)]
+
+
+def recall_at(vectors, reference, k=10, queries=500):
+    exact = faiss.IndexFlatIP(reference.shape[1])
+    exact.add(reference)
+    stored = faiss.IndexFlatIP(vectors.shape[1])
+    stored.add(vectors)
+    _, truth = exact.search(reference[:queries], k)
+    _, found = stored.search(reference[:queries], k)
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel, cached embedding generation")
+    parser.add_argument('--chunks', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, default_workers()])
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+    if not embeddings_available():
+        sys.exit("sentence-transformers is not installed")
+
+    texts = corpus(args.chunks)
+    folder = tempfile.mkdtemp()
+    print(f"{'run':<28}{'chunks':>8}{'seconds':>10}{'chunks/s':>10}")
+    for workers in args.workers:
+        cache = EmbeddingCache(os.path.join(folder, f'workers{workers}'), dtype='float32')
+        for run in ('encode', 'cached'):
+            start = time.perf_counter()
+            rows = cache.embed(texts, workers=workers, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - start
+            print(f"{f'{run}, {workers} workers':<28}{len(texts):>8}{elapsed:>10.2f}{len(texts) / elapsed:>10.0f}")
+        reference = cache.vectors(rows)
+        cache.close()
+
+    # other storage types reuse the float32 vectors, only the quantization differs
+    print(f"\n{'dtype':<10}{'file MB':>9}{'recall@10':>11}")
+    for dtype in DTYPES:
+        cache = EmbeddingCache(os.path.join(folder, dtype), dtype=dtype)
+        cache._reserve(len(reference), reference.shape[1])
+        cache.matrix[:len(reference)] = cache._quantize(reference)
+        cache.matrix.flush()
+        print(f"{dtype:<10}{os.path.getsize(cache.matrix_path) / 2 ** 20:>9.1f}"
+              f"{recall_at(cache.vectors(np.arange(len(reference))), reference):>11.3f}")
+        cache.close()
@@ -0,0 +1,50 @@
+# Records/sec of every html_parsing backend on saved pages, and whether they agree
+#
+# Fixtures: paper_classification/test.html (rendered DOAJ results),
+# paper_classification/test-requests.html (the same page fetched without a
+# browser, no records) and a 2000-entry arXiv listing generated from
+# articles.json (fixtures.listing_html). Outputs are compared with the bs4
+# reference backend.
+#
+# Usage: python benchmarks/bench_html.py [--repeat 20]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from   html_parsing import available_backends, parse_arxiv_listing, parse_doaj_records
+from   fixtures import ROOT, listing_html, load_articles
+
+
+def best_time(func, html_content, backend, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = func(html_content, backend)
+        timings.append(time.perf_counter() - start)
+    return records, min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the HTML extraction backends")
+    parser.add_argument('--repeat', type=int, default=20, help='runs per backend and page, the best one counts')
+    args = parser.parse_args()
+
+    pages = []
+    for name in ('test.html', 'test-requests.html'):
+        with open(os.path.join(ROOT, 'paper_classification', name), 'r', encoding='utf-8') as f:
+            pages.append((name, parse_doaj_records, f.read()))
+    pages.append(('arxiv listing (2000)', parse_arxiv_listing, listing_html(load_articles() * 10)))
+
+    print(f"{'page':<24}{'backend':<12}{'records':>8}{'ms':>10}{'records/s':>12}{'speedup':>9}  same as bs4")
+    for name, func, html_content in pages:
+        reference, reference_time = best_time(func, html_content, 'bs4', args.repeat)
+        for backend in available_backends():
+            records, elapsed = (reference, reference_time) if backend == 'bs4' else \
+                best_time(func, html_content, backend, args.repeat)
+            rate = len(records) / elapsed if elapsed > 0 else 0.0
+            print(f"{name:<24}{backend:<12}{len(records):>8}{elapsed * 1000:>10.2f}{rate:>12.0f}"
+                  f"{reference_time / elapsed:>8.1f}x  {'yes' if records == reference else 'NO'}")
@@ -0,0 +1,92 @@
+# Speed and agreement of the keyword extraction modes on articles.json
+#
+# Runs article_scraper.extract_keywords in 'llm', 'batch' and 'embedding' mode
+# (the last only when sentence-transformers is installed) and reports
+# articles/s, LLM requests, and the mean Jaccard overlap of the lower-cased
+# keyword sets with the 'llm' mode and with the authors' DOAJ keywords.
+#
+# By default the LLM modes run against the offline mock (mock_ollama.py), which
+# measures request overhead only and makes LLM agreement meaningless; pass
+# --api-url http://localhost:11434 to compare against a real Ollama server.
+#
+# Usage: python benchmarks/bench_keywords.py [--articles 100] [--api-url URL] [--json out.json]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'paper_classification'))
+
+import llm_gateway
+from   article_scraper import extract_keywords
+from   embedding_classifier import embeddings_available
+from   fixtures import load_articles
+from   mock_ollama import start_mock_server
+
+
+def normalize(keywords):
+    # DOAJ keywords come as "big data algorithms," -> "big data algorithms"
+    return {keyword.strip(' ,;.').lower() for keyword in keywords if keyword.strip(' ,;.')}
+
+
+def jaccard(a, b):
+    a, b = normalize(a), normalize(b)
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare keyword extraction modes")
+    parser.add_argument('--articles', type=int, default=100)
+    parser.add_argument('--api-url', help='real Ollama server; default is the offline mock')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock time to first token (s)')
+    parser.add_argument('--tps', type=float, default=200.0, help='mock tokens per second')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    server = None
+    api_url = args.api_url
+    if api_url is None:
+        server, mock, api_url = start_mock_server(latency=args.latency, tokens_per_sec=args.tps)
+    # no LLM cache, so every mode reaches the server
+    llm_gateway._gateways[api_url] = llm_gateway.LLMGateway(api_url, cache=None)
+    gateway = llm_gateway._gateways[api_url]
+
+    articles = load_articles(args.articles)
+    modes = ['llm', 'batch'] + (['embedding'] if embeddings_available() else [])
+    outputs, rows = {}, []
+    print(f"{'mode':<12}{'articles':>9}{'seconds':>10}{'art/s':>10}{'requests':>10}{'vs llm':>9}{'vs doaj':>9}")
+    for mode in modes:
+        requests_before = gateway.stats['requests']
+        start = time.perf_counter()
+        outputs[mode] = extract_keywords(articles, mode, api_url)
+        elapsed = time.perf_counter() - start
+        row = {
+            'mode': mode,
+            'articles': len(articles),
+            'seconds': elapsed,
+            'articles_per_sec': len(articles) / elapsed if elapsed > 0 else 0.0,
+            'requests': gateway.stats['requests'] - requests_before,
+            'agreement_llm': mean([jaccard(a, b) for a, b in zip(outputs[mode], outputs['llm'])]),
+            'agreement_doaj': mean([jaccard(a, article['keywords']) for a, article in zip(outputs[mode], articles)]),
+            'empty': sum(not keywords for keywords in outputs[mode]),
+        }
+        rows.append(row)
+        print(f"{mode:<12}{row['articles']:>9}{elapsed:>10.2f}{row['articles_per_sec']:>10.1f}{row['requests']:>10}"
+              f"{row['agreement_llm']:>9.2f}{row['agreement_doaj']:>9.2f}")
+    if 'embedding' not in modes:
+        print(f"{'embedding':<12}skipped (sentence-transformers is not installed)")
+
+    if server is not None:
+        server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'modes': rows,
+                       'examples': {mode: output[:5] for mode, output in outputs.items()}}, f, indent=2)
+        print(f"Results written to {args.json}")
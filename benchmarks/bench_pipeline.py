@@ -0,0 +1,183 @@
+# Offline end-to-end benchmark: throughput and p50/p99 latency per stage
+#
+# Runs every stage of the repo against local stand-ins, so regressions show up
+# in a plain Linux run without a GPU Ollama container or network access:
+#   listing         crawler pages served from fixtures (fixtures.replay_session)
+#   extraction      PDF download + pdfminer + section parse
+#   summarization   bot_response against the mock Ollama server (mock_ollama.py)
+#   classification  one call per summary and the batched ID-keyed mode
+#   keywords        article_scraper.llm_keywords on the DOAJ articles
+#   pipeline        run_pipeline end to end (download -> extract -> LLM -> SQLite)
+#   indexing        rag.create_faiss_index         } only when sentence-transformers
+#   retrieval       rag.retrieve_documents         } is installed
+#
+# The LLM cache is bypassed, so every call reaches the mock server.
+#
+# Usage: python benchmarks/bench_pipeline.py [--papers 50] [--latency 0.05] [--tps 200] [--malformed 0.05] [--json out.json]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from   concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'paper_classification'))
+
+import funcs
+import llm_gateway
+import pipeline
+from   configs import article_main_url, llm_max_in_flight
+from   fixtures import load_articles, replay_session
+from   mock_ollama import start_mock_server
+from   sections import parse_sections
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def report(name, latencies, elapsed, items=None):
+    items = len(latencies) if items is None else items
+    row = {
+        'stage': name,
+        'items': items,
+        'seconds': elapsed,
+        'items_per_sec': items / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+    print(f"{name:<24}{items:>7}{elapsed:>10.2f}{row['items_per_sec']:>10.1f}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+    return row
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def timed_map(func, items, workers=1):
+    # returns (results, per-item latencies, wall time)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pairs = list(executor.map(lambda item: timed(func, item), items))
+    return [result for result, _ in pairs], [latency for _, latency in pairs], time.perf_counter() - start
+
+
+def bench_listing(session, page_size):
+    latencies, links = [], []
+    start = time.perf_counter()
+    skip = 0
+    while True:
+        page, latency = timed(lambda: list(funcs.parse_listing_page(
+            funcs.fetch_listing_page(article_main_url, {'skip': skip, 'show': page_size}, session))))
+        latencies.append(latency)
+        links.extend(link for link, _ in page)
+        if len(page) < page_size:
+            break
+        skip += page_size
+    return links, report('listing (pages)', latencies, time.perf_counter() - start)
+
+
+def bench_extraction(session, urls):
+    def extract(url):
+        text = funcs.pdf_to_text(funcs.download_pdf(url, session))
+        return text, parse_sections(text)
+    results, latencies, elapsed = timed_map(extract, urls)
+    return results, report('extraction', latencies, elapsed)
+
+
+def bench_summarization(mock_url, extracted):
+    payloads = [parsed['abstract'] or text for text, parsed in extracted]
+    summaries, latencies, elapsed = timed_map(
+        lambda payload: funcs.bot_response(funcs.build_summary_messages(payload), mock_url),
+        payloads, workers=llm_max_in_flight)
+    return summaries, report('summarization', latencies, elapsed)
+
+
+def bench_classification(mock_url, summaries):
+    rows = [report('classification (single)', *timed_map(
+        lambda item: funcs.classify_summaries_with_two_layers(mock_url, [item]), summaries,
+        workers=llm_max_in_flight)[1:])]
+    _, elapsed = timed(funcs.classify_summaries_batched, mock_url, summaries)
+    rows.append(report('classification (batch)', [], elapsed, items=len(summaries)))
+    return rows
+
+
+def bench_keywords(mock_url, articles):
+    from article_scraper import llm_keywords
+    _, latencies, elapsed = timed_map(lambda article: llm_keywords(article['title'], article['abstract'], mock_url),
+                                      articles, workers=llm_max_in_flight)
+    return report('keywords', latencies, elapsed)
+
+
+def bench_pipeline(mock_url, urls):
+    with tempfile.TemporaryDirectory() as tmp:
+        stats, elapsed = timed(pipeline.run_pipeline, urls, os.path.join(tmp, 'summaries.db'), mock_url,
+                               session=replay_session())
+    return report('pipeline (end to end)', [], elapsed, items=stats['saved'])
+
+
+def bench_rag(texts, queries):
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        print(f"{'indexing / retrieval':<24}skipped (sentence-transformers is not installed)")
+        return []
+    import rag
+    documents = [paragraph for text in texts for paragraph in text.split('\n\n') if paragraph.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = rag.EmbeddingCache(os.path.join(tmp, 'embedding_cache'))
+        (index, _), elapsed = timed(rag.create_faiss_index, documents, os.path.join(tmp, 'index.bin'), cache)
+        cache.close()
+    rows = [report('indexing (chunks)', [], elapsed, items=len(documents))]
+    _, latencies, elapsed = timed_map(lambda query: rag.retrieve_documents(query, index, documents, k=5), queries)
+    rows.append(report('retrieval', latencies, elapsed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline per-stage benchmark of the summarization pipeline")
+    parser.add_argument('--papers', type=int, default=50, help='papers to extract, summarize and classify')
+    parser.add_argument('--page-size', type=int, default=25, help='listing page size')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock time to first token (s)')
+    parser.add_argument('--tps', type=float, default=200.0, help='mock tokens per second')
+    parser.add_argument('--malformed', type=float, default=0.05, help='share of malformed mock answers')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    server, mock, mock_url = start_mock_server(latency=args.latency, tokens_per_sec=args.tps,
+                                               malformed_rate=args.malformed)
+    # no LLM cache, so reruns measure the server path every time
+    llm_gateway._gateways[mock_url] = llm_gateway.LLMGateway(mock_url, cache=None)
+    # module-level default (shared) session serves from the fixtures too
+    session = replay_session()
+    funcs._session = session
+    articles = load_articles()
+
+    print(f"{'stage':<24}{'items':>7}{'seconds':>10}{'items/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    rows = []
+    links, row = bench_listing(session, args.page_size)
+    rows.append(row)
+    urls = links[:args.papers]
+    extracted, row = bench_extraction(session, urls)
+    rows.append(row)
+    summaries, row = bench_summarization(mock_url, extracted)
+    rows.append(row)
+    rows.extend(bench_classification(mock_url, list(zip(urls, summaries))))
+    rows.append(bench_keywords(mock_url, articles[:args.papers]))
+    rows.append(bench_pipeline(mock_url, urls))
+    rows.extend(bench_rag([text for text, _ in extracted], [article['title'] for article in articles[:20]]))
+
+    print(f"Mock server: {mock.stats}, gateway: {llm_gateway._gateways[mock_url].stats}")
+    server.shutdown()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'stages': rows, 'mock': mock.stats}, f, indent=2)
+        print(f"Results written to {args.json}")
@@ -0,0 +1,76 @@
+# Micro-benchmark: old abstract regex + paragraph re.sub vs the single-pass section parser
+#
+# Usage: python benchmarks/bench_sections.py [folder with .txt papers] [repeats]
+# Defaults to ./data (as written by save_pdfs.py); falls back to the texts in text_cache.db.
+
+import os
+import re
+import sys
+import time
+import zlib
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sections import parse_sections
+from configs import text_cache_db
+
+# what funcs.extract_abstract_section and rag.load_txt_files did before
+# (the original pattern used an inline flag mid-expression, which Python 3.11 rejects)
+OLD_ABSTRACT_RE = r'(?i)abstract\s*(.*?)\n{2,}'
+
+
+def old_parse(text):
+    match = re.search(OLD_ABSTRACT_RE, text, re.DOTALL)
+    abstract = match.group(1).replace('\n', ' ').strip() if match else ""
+    paragraphs = [re.sub(r'\s+', ' ', para).strip() for para in text.split("\n\n")]
+    return abstract, [p for p in paragraphs if p]
+
+
+def new_parse(text):
+    doc = parse_sections(text)
+    paragraphs = [' '.join(text[start:end].split()) for start, end in doc['paragraphs']]
+    return doc['abstract'], paragraphs
+
+
+def load_papers(folder):
+    if os.path.isdir(folder):
+        papers = []
+        for file in sorted(os.listdir(folder)):
+            if file.endswith('.txt') and not file.startswith('clean_'):
+                with open(os.path.join(folder, file), 'r', encoding='utf-8') as f:
+                    papers.append(f.read())
+        if papers:
+            return papers
+    if os.path.exists(text_cache_db):
+        conn = sqlite3.connect(text_cache_db)
+        return [zlib.decompress(blob).decode('utf-8') for (blob,) in conn.execute('SELECT text FROM texts')]
+    return []
+
+
+def bench(func, papers, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in papers:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    papers = load_papers(folder)
+    if not papers:
+        sys.exit(f"No papers found in {folder} or {text_cache_db}; run save_pdfs.py first.")
+
+    total_mb = sum(len(text) for text in papers) / 1e6
+    old_time = bench(old_parse, papers, repeats)
+    new_time = bench(new_parse, papers, repeats)
+    same_abstract = sum(old_parse(text)[0].split() == new_parse(text)[0].split() for text in papers)
+
+    print(f"{len(papers)} papers, {total_mb:.1f} MB of text, best of {repeats}")
+    print(f"old regex + split : {old_time * 1000 / len(papers):8.2f} ms/paper  {total_mb / old_time:8.1f} MB/s")
+    print(f"parse_sections    : {new_time * 1000 / len(papers):8.2f} ms/paper  {total_mb / new_time:8.1f} MB/s")
+    print(f"speedup           : {old_time / new_time:8.2f}x")
+    print(f"same abstract (ignoring whitespace): {same_abstract}/{len(papers)}")
@@ -0,0 +1,177 @@
+# Replayable HTTP fixtures built from the checked-in DOAJ data
+#
+# paper_classification/articles.json (title + abstract of 400 real articles)
+# stands in for an arXiv listing: every article gets a fake arXiv id, a listing
+# entry, an export API version and a small generated PDF holding its title,
+# abstract and a few body paragraphs. paper_classification/test.html is served
+# for DOAJ search pages. replay_session() returns a requests.Session that
+# answers from these fixtures, so crawling and extraction run without network.
+
+import json
+import os
+import re
+import requests
+from   urllib.parse import urlparse, parse_qs
+from   requests.adapters import BaseAdapter
+from   requests.models import Response
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTICLES_JSON = os.path.join(ROOT, 'paper_classification', 'articles.json')
+DOAJ_HTML = os.path.join(ROOT, 'paper_classification', 'test.html')
+
+# Listing days are assigned round robin, newest first
+LISTING_DAYS = ['Fri, 15 Nov 2024', 'Thu, 14 Nov 2024', 'Wed, 13 Nov 2024', 'Tue, 12 Nov 2024', 'Mon, 11 Nov 2024']
+
+
+def load_articles(limit=None):
+    with open(ARTICLES_JSON, 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+    return articles[:limit] if limit else articles
+
+
+def arxiv_id(index):
+    return f'2411.{10000 + index:05d}'
+
+
+def listing_html(articles, skip=0, show=None):
+    # arXiv "recent" listing layout: day headers inside dl#articles, one Abstract link per entry
+    end = len(articles) if show is None else min(skip + show, len(articles))
+    per_day = max(1, -(-len(articles) // len(LISTING_DAYS)))
+    parts = ["<html><body><div id='dlpage'><dl id='articles'>"]
+    day = None
+    for index in range(skip, end):
+        if index // per_day != day:
+            day = index // per_day
+            parts.append(f'<h3>{LISTING_DAYS[day]} (showing {per_day} of {per_day} entries )</h3>')
+        id_ = arxiv_id(index)
+        parts.append(f'<dt><a href ="/abs/{id_}" title="Abstract" id="{id_}">arXiv:{id_}</a></dt>'
+                     f'<dd><div class="list-title">{articles[index]["title"]}</div></dd>')
+    parts.append('</dl></div></body></html>')
+    return ''.join(parts)
+
+
+def atom_feed(ids):
+    entries = ''.join(f'<entry><id>http://arxiv.org/abs/{id_}v1</id></entry>' for id_ in ids)
+    return f'<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+
+
+def _pdf_escape(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text, width=90):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}' if line else word
+    return lines + ([line] if line else [])
+
+
+def make_pdf(title, abstract, paragraphs=()):
+    # Single-page (or multi-page) PDF with Helvetica text. Blocks are separated by a
+    # blank line's worth of space, so pdfminer returns them as separate paragraphs.
+    blocks = [[title], ['Abstract'] + _wrap(abstract)]
+    for number, paragraph in enumerate(paragraphs, 1):
+        blocks.append([f'{number} Section {number}'])
+        blocks.append(_wrap(paragraph))
+
+    pages, page, y = [], [], 760
+    for block in blocks:
+        if y - 12 * len(block) < 60 and page:
+            pages.append(page)
+            page, y = [], 760
+        for line in block:
+            page.append(f'BT /F1 10 Tf 50 {y} Td ({_pdf_escape(line)}) Tj ET')
+            y -= 12
+        y -= 14
+    pages.append(page)
+
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    kids = []
+    for content in pages:
+        stream = '\n'.join(content).encode('latin-1')
+        objects.append(f'<< /Length {len(stream)} >>\nstream\n'.encode('latin-1') + stream + b'\nendstream')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        body = body if isinstance(body, bytes) else body.encode('latin-1')
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    out += b''.join(f'{offset:010d} 00000 n \n'.encode() for offset in offsets)
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(out)
+
+
+class ReplayAdapter(BaseAdapter):
+    # serves arxiv.org listings/PDFs, the export API and DOAJ pages from the fixtures
+    def __init__(self, articles=None, body_paragraphs=8):
+        super().__init__()
+        self.articles = articles if articles is not None else load_articles()
+        self.body_paragraphs = body_paragraphs
+        self.requests = 0
+        self._pdfs = {}
+        with open(DOAJ_HTML, 'r', encoding='utf-8') as f:
+            self.doaj_html = f.read()
+
+    def pdf(self, index):
+        if index not in self._pdfs:
+            article = self.articles[index]
+            # reuse the abstract sentences as body text, to get paper-like length
+            sentences = re.split(r'(?<=\.)\s+', article['abstract']) or [article['abstract']]
+            paragraphs = [' '.join(sentences[(i + j) % len(sentences)] for j in range(4))
+                          for i in range(self.body_paragraphs)]
+            self._pdfs[index] = make_pdf(article['title'], article['abstract'], paragraphs)
+        return self._pdfs[index]
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        url = urlparse(request.url)
+        query = parse_qs(url.query)
+        status, body, content_type = 404, b'not found', 'text/plain'
+
+        if url.netloc.endswith('arxiv.org') and url.path.startswith('/list/'):
+            skip = int(query.get('skip', ['0'])[0])
+            show = int(query.get('show', ['50'])[0])
+            status, body, content_type = 200, listing_html(self.articles, skip, show).encode(), 'text/html'
+        elif url.netloc.endswith('arxiv.org') and url.path.startswith('/pdf/'):
+            match = re.match(r'2411\.(\d{5})', url.path.rsplit('/', 1)[-1])
+            index = int(match.group(1)) - 10000 if match else -1
+            if 0 <= index < len(self.articles):
+                status, body, content_type = 200, self.pdf(index), 'application/pdf'
+        elif url.path == '/api/query':
+            ids = query.get('id_list', [''])[0].split(',')
+            status, body, content_type = 200, atom_feed(ids).encode(), 'application/atom+xml'
+        elif url.netloc.endswith('doaj.org'):
+            status, body, content_type = 200, self.doaj_html.encode(), 'text/html'
+
+        response = Response()
+        response.status_code = status
+        response._content = body
+        response.headers['Content-Type'] = content_type
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+    def close(self):
+        pass
+
+
+def replay_session(articles=None, body_paragraphs=8):
+    session = requests.Session()
+    adapter = ReplayAdapter(articles, body_paragraphs)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,199 @@
+# Offline stand-in for the Ollama HTTP API
+#
+# Serves /api/chat and /api/generate (streamed and not), /api/tags and
+# /api/version with canned answers shaped like the ones the repo's prompts
+# expect: summaries, "Level 1: Level 2" lines, "id|Level 1: Level 2" batches,
+# keyword lists (single and "id|[...]" batches), single categories and RAG
+# answers. A configurable share of answers is malformed (no colon, dropped
+# batch lines) to exercise the retry and re-queue paths. Latency is modelled
+# as time to first token plus num_predict-capped tokens at a fixed tokens/sec.
+#
+# Usage: python benchmarks/mock_ollama.py [--port 11434] [--latency 0.2] [--tps 50] [--malformed 0.1]
+# or start_mock_server(...) in-process (port 0 picks a free port).
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from   http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CATEGORIES = [
+    ('Machine Learning', 'Reinforcement Learning'),
+    ('Machine Learning', 'Federated Learning'),
+    ('Computer Vision', 'Image Classification'),
+    ('Natural Language Processing', 'Information Extraction'),
+    ('Natural Language Processing', 'Large Language Models'),
+    ('Robotics', 'Motion Planning'),
+    ('Software Engineering', 'Software Security'),
+]
+KEYWORDS = ['Deep Learning', 'Graph Neural Networks', 'Differential Privacy', 'Blockchain', 'IoT',
+            'Recommendation Systems', 'Transformers', 'Federated Learning', 'Anomaly Detection', 'Big Data']
+SUMMARY = ('The paper proposes a scalable method that improves accuracy and efficiency on standard benchmarks, '
+           'analyses its limitations and releases code to support reproducible follow-up research.')
+
+
+def _pick(items, key):
+    return items[int(hashlib.md5(key.encode()).hexdigest(), 16) % len(items)]
+
+
+class MockOllama:
+    def __init__(self, latency=0.05, tokens_per_sec=200.0, malformed_rate=0.0, seed=0):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'tokens': 0, 'aborted': 0}
+
+    def _malformed(self):
+        with self.lock:
+            return self.random.random() < self.malformed_rate
+
+    def respond(self, prompt):
+        # canned answer for the prompt families used in the repo
+        if 'ID|Level 1: Level 2' in prompt:
+            lines = []
+            for id_ in re.findall(r'^\s*([0-9a-f]{8})\s*$', prompt, re.MULTILINE):
+                if not self._malformed():
+                    lines.append('{}|{}: {}'.format(id_, *_pick(CATEGORIES, id_)))
+            return '\n'.join(lines)
+        if 'ID|[Keyword' in prompt:
+            ids = re.findall(r'^\s*([0-9a-f]{8})\s*$', prompt, re.MULTILINE)
+            return '\n'.join(f'{id_}|[{", ".join(self._keywords(id_))}]' for id_ in ids if not self._malformed())
+        if 'Level 1: Level 2' in prompt:
+            if self._malformed():
+                return 'This paper is mostly about machine learning.'
+            return '{}: {}\nThe summary focuses on this area.'.format(*_pick(CATEGORIES, prompt))
+        if 'ID-Category pairs' in prompt:
+            ids = re.findall(r'Article ID: ([0-9a-f]{32})', prompt)
+            return '\n'.join(f'{id_}|{_pick(KEYWORDS, id_)}' for id_ in ids if not self._malformed())
+        if 'Top 5 keywords' in prompt:
+            return f'[{", ".join(self._keywords(prompt))}]\nThese keywords summarise the article.'
+        if 'mean the same thing' in prompt:
+            return 'Yes'
+        if 'single most appropriate category' in prompt:
+            return f'{_pick(KEYWORDS, prompt)}\nThis category fits best.'
+        if 'Query:' in prompt:
+            return 'Most papers in the context study efficient and trustworthy machine learning systems.'
+        return SUMMARY
+
+    def _keywords(self, key):
+        start = int(hashlib.md5(key.encode()).hexdigest(), 16) % len(KEYWORDS)
+        return [KEYWORDS[(start + i) % len(KEYWORDS)] for i in range(5)]
+
+    def tokens(self, text, num_predict):
+        tokens = re.findall(r'\s*\S+|\s+', text)
+        if num_predict and num_predict > 0:
+            tokens = tokens[:num_predict]
+        return tokens
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': 'llama3.2:latest', 'model': 'llama3.2:latest'}]})
+        elif self.path == '/api/version':
+            self._send_json({'version': 'mock'})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path == '/api/chat':
+            prompt = '\n'.join(message.get('content', '') for message in request.get('messages', []))
+        elif self.path == '/api/generate':
+            prompt = request.get('prompt', '')
+        else:
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        mock = self.mock
+        with mock.lock:
+            mock.stats['requests'] += 1
+        options = request.get('options') or {}
+        tokens = mock.tokens(mock.respond(prompt), options.get('num_predict'))
+        delay = 1.0 / mock.tokens_per_sec if mock.tokens_per_sec else 0.0
+        time.sleep(mock.latency)
+
+        def chunk(text, done):
+            payload = {'model': request.get('model', ''), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ'), 'done': done}
+            if self.path == '/api/chat':
+                payload['message'] = {'role': 'assistant', 'content': text}
+            else:
+                payload['response'] = text
+            if done:
+                payload.update({'done_reason': 'stop', 'eval_count': len(tokens), 'prompt_eval_count': len(prompt) // 4})
+            return payload
+
+        if request.get('stream', True):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            sent = 0
+            try:
+                for token in tokens + [None]:
+                    if token is not None:
+                        time.sleep(delay)
+                    data = json.dumps(chunk(token or '', token is None)).encode() + b'\n'
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    self.wfile.flush()
+                    sent += token is not None
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                with mock.lock:
+                    mock.stats['aborted'] += 1
+                self.close_connection = True
+            with mock.lock:
+                mock.stats['tokens'] += sent
+        else:
+            time.sleep(delay * len(tokens))
+            with mock.lock:
+                mock.stats['tokens'] += len(tokens)
+            self._send_json(chunk(''.join(tokens), True))
+
+
+def start_mock_server(host='127.0.0.1', port=0, **kwargs):
+    # returns (server, mock, url); the server runs in a daemon thread until server.shutdown()
+    mock = MockOllama(**kwargs)
+    handler = type('MockHandler', (_Handler,), {'mock': mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, mock, f'http://{host}:{server.server_port}'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Ollama API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds before the first token')
+    parser.add_argument('--tps', type=float, default=50.0, help='generated tokens per second')
+    parser.add_argument('--malformed', type=float, default=0.0, help='share of malformed answers')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server, mock, url = start_mock_server(args.host, args.port, latency=args.latency, tokens_per_sec=args.tps,
+                                          malformed_rate=args.malformed, seed=args.seed)
+    print(f"Mock Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
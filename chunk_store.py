@@ -0,0 +1,237 @@
+# Persistent chunk store for rag.py
+#
+# Holds the text of every indexed chunk with its source (file, paragraph
+# offset, part number) under the same integer id as its vector in the FAISS
+# IndexIDMap, plus the size, mtime and sha256 of every indexed source file
+# (the manifest rag.update_rag_index() diffs against data/). Queries then only
+# load the index and fetch the k chunks they need, instead of re-reading and
+# re-chunking data/ to map row numbers back to text.
+#
+# is_consistent() tells whether the index and the store still describe the
+# files on disk.
+#
+# With dedup on, add_file() drops chunks that repeat (exactly or nearly, see
+# chunker.ChunkDeduper) a chunk already stored, and records which file dropped
+# a duplicate of which chunk; when that chunk goes away, dependent_files()
+# names the files to re-chunk so their copy comes back. The MinHash signature of
+# every kept chunk is stored with it, so the deduper is rebuilt without re-hashing.
+
+import hashlib
+import json
+import os
+import sqlite3
+import numpy as np
+from   chunker import ChunkDeduper
+from   configs import *
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_files(folder_path, prefer_clean=rag_prefer_clean):
+    # {file name: (size, mtime)} of the .txt files rag.py indexes; a paper is indexed once, from
+    # its clean_ copy (save_pdfs.py) when there is one
+    files = {}
+    names = set(os.listdir(folder_path))
+    for file in names:
+        if file.endswith(".txt") and not (prefer_clean and 'clean_' + file in names):
+            stat = os.stat(os.path.join(folder_path, file))
+            files[file] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+def index_signature(index_file):
+    stat = os.stat(index_file)
+    return [stat.st_size, stat.st_mtime]
+
+
+class ChunkStore:
+    def __init__(self, db_name=chunk_store_db, dedup=chunk_dedup):
+        self.db_name = db_name
+        self.dedup = dedup
+        self._deduper = None
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                file TEXT,
+                start INTEGER,
+                part INTEGER,
+                text TEXT
+            )
+        ''')
+        # stores from before deduplication
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(chunks)')]
+        for column, type_ in (('hash', 'TEXT'), ('minhash', 'BLOB')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE chunks ADD COLUMN {column} {type_}')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS chunks_file ON chunks (file)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS duplicates (file TEXT, of_id INTEGER)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS duplicates_of_id ON duplicates (of_id)')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                file TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime REAL,
+                hash TEXT
+            )
+        ''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM chunks').fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    # The methods below do not commit: rag.update_rag_index() commits once the index file
+    # holding the same change has been written, or rolls back.
+    def clear(self):
+        # the saved index no longer matches until mark_built() records the new one
+        self.conn.execute("DELETE FROM meta WHERE key = 'index'")
+        self.conn.execute('DELETE FROM chunks')
+        self.conn.execute('DELETE FROM files')
+        self.conn.execute('DELETE FROM duplicates')
+        self._deduper = None
+
+    def rollback(self):
+        # undo everything since the last commit; the deduper is rebuilt from the committed rows
+        self.conn.rollback()
+        self._deduper = None
+
+    @property
+    def deduper(self):
+        if self._deduper is None:
+            self._deduper = ChunkDeduper()
+            for id_, hash_, signature in self.conn.execute('SELECT id, hash, minhash FROM chunks WHERE minhash IS NOT NULL'):
+                self._deduper.add(id_, hash_, np.frombuffer(signature, dtype=np.uint32))
+        return self._deduper
+
+    def add_file(self, folder_path, file, chunks):
+        # record a source file and its [(start, part, text)] chunks; returns the ids of the chunks
+        # kept (all of them without dedup)
+        stat = os.stat(os.path.join(folder_path, file))
+        self.conn.execute('INSERT OR REPLACE INTO files (file, size, mtime, hash) VALUES (?, ?, ?, ?)',
+                          (file, stat.st_size, stat.st_mtime, file_sha256(os.path.join(folder_path, file))))
+        ids = []
+        for start, part, text in chunks:
+            hash_ = signature = None
+            if self.dedup:
+                kind, original, hash_, signature = self.deduper.check(text)
+                if kind:
+                    self.conn.execute('INSERT INTO duplicates (file, of_id) VALUES (?, ?)', (file, original))
+                    continue
+            cursor = self.conn.execute('INSERT INTO chunks (file, start, part, text, hash, minhash) VALUES (?, ?, ?, ?, ?, ?)',
+                                       (file, start, part, text, hash_,
+                                        None if signature is None else signature.tobytes()))
+            ids.append(cursor.lastrowid)
+            if self.dedup:
+                self.deduper.add(cursor.lastrowid, hash_, signature)
+        return ids
+
+    def remove_file(self, file):
+        # forget a source file; returns the ids of its chunks
+        ids = [row[0] for row in self.conn.execute('SELECT id FROM chunks WHERE file = ?', (file,))]
+        if self._deduper is not None:
+            for id_ in ids:
+                if id_ in self._deduper.signatures:
+                    self._deduper.remove(id_)
+        self.conn.execute('DELETE FROM chunks WHERE file = ?', (file,))
+        self.conn.execute('DELETE FROM files WHERE file = ?', (file,))
+        self.conn.execute('DELETE FROM duplicates WHERE file = ?', (file,))
+        return ids
+
+    def dependent_files(self, ids):
+        # files that dropped a duplicate of one of these chunks
+        ids = [int(id_) for id_ in ids]
+        files = set()
+        for i in range(0, len(ids), 500):
+            placeholders = ','.join('?' * len(ids[i:i + 500]))
+            files.update(row[0] for row in self.conn.execute(
+                f'SELECT DISTINCT file FROM duplicates WHERE of_id IN ({placeholders})', ids[i:i + 500]))
+        return files
+
+    def mark_built(self, settings, index_file, trained_on):
+        # call after writing index_file, so the store can tell it is the matching one;
+        # trained_on: chunks the index was built (IVF cells sized) for
+        self.set_meta('settings', settings)
+        self.set_meta('index', index_signature(index_file))
+        self.set_meta('trained_on', trained_on)
+
+    def texts(self, ids):
+        # chunk texts for the given ids, in the same order; '' for unknown ids (FAISS pads with -1)
+        ids = [int(id_) for id_ in ids]
+        placeholders = ','.join('?' * len(ids))
+        rows = dict(self.conn.execute(f'SELECT id, text FROM chunks WHERE id IN ({placeholders})', ids).fetchall())
+        return [rows.get(id_, '') for id_ in ids]
+
+    def all_texts(self):
+        # (ids, texts) of every stored chunk, by id
+        rows = self.conn.execute('SELECT id, text FROM chunks ORDER BY id').fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def __getitem__(self, id_):
+        return self.texts([id_])[0]
+
+    def sources(self, ids):
+        # [(file, start, part)] for the given ids
+        ids = [int(id_) for id_ in ids]
+        placeholders = ','.join('?' * len(ids))
+        rows = {row[0]: row[1:] for row in self.conn.execute(
+            f'SELECT id, file, start, part FROM chunks WHERE id IN ({placeholders})', ids).fetchall()}
+        return [rows.get(id_) for id_ in ids]
+
+    def diff_files(self, folder_path):
+        # {'added', 'removed', 'modified'} files since the store was updated; size and mtime
+        # first, the hash only decides for files whose mtime moved
+        stored = {file: (size, mtime, hash_) for file, size, mtime, hash_ in
+                  self.conn.execute('SELECT file, size, mtime, hash FROM files').fetchall()}
+        current = scan_files(folder_path)
+        modified = []
+        for file in set(stored) & set(current):
+            size, mtime, hash_ = stored[file]
+            if current[file] == (size, mtime):
+                continue
+            if current[file][0] != size or file_sha256(os.path.join(folder_path, file)) != hash_:
+                modified.append(file)
+            else:
+                # touched but identical, remember the new mtime to skip hashing next time
+                self.conn.execute('UPDATE files SET mtime = ? WHERE file = ?', (current[file][1], file))
+        self.conn.commit()
+        return {'added': sorted(set(current) - set(stored)), 'removed': sorted(set(stored) - set(current)),
+                'modified': sorted(modified)}
+
+    def changed_files(self, folder_path):
+        return sorted(file for files in self.diff_files(folder_path).values() for file in files)
+
+    def is_consistent(self, index, folder_path, settings, index_file=None, debug=False):
+        # the index holds exactly the stored chunks, chunked the same way, from unchanged files;
+        # folder_path=None skips the (slower) check of the files
+        problems = []
+        if index_file and self.get_meta('index') != index_signature(index_file):
+            problems.append(f"{index_file} was not built together with this store")
+        if self.get_meta('settings') != settings:
+            problems.append(f"index settings changed ({self.get_meta('settings')} -> {settings})")
+        if index.ntotal != len(self):
+            problems.append(f"index has {index.ntotal} vectors, store has {len(self)} chunks")
+        changed = self.changed_files(folder_path) if folder_path else []
+        if changed:
+            problems.append(f"{len(changed)} files changed since the index was built, e.g. {changed[0]}")
+        for problem in problems:
+            print(f"Chunk store out of date: {problem}")
+        if debug and not problems:
+            print(f"DEBUG: Chunk store consistent with the index ({len(self)} chunks).")
+        return not problems
+
+    def close(self):
+        self.conn.close()
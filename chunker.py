@@ -0,0 +1,184 @@
+# Streaming, token-aware chunker for rag.py
+#
+# Files are read in blocks and split into sentences on the fly (blank lines end
+# a sentence too), so a paper is never held in memory whole. Sentences are
+# packed into chunks of at most chunk_tokens tokens (prompt_budget.count_tokens);
+# the last sentences of a chunk, up to chunk_overlap_tokens, open the next one,
+# so no chunk starts or ends mid-sentence. A sentence longer than a chunk is cut
+# between words.
+#
+# ChunkDeduper drops chunks before they are embedded: exact duplicates by a hash
+# of the normalized text, near duplicates by MinHash signatures over word
+# 3-grams, looked up through LSH bands and confirmed when the estimated Jaccard
+# similarity reaches chunk_dedup_threshold. Hashes are seeded, not salted, so
+# signatures stay valid across runs (chunk_store.py persists them).
+
+import hashlib
+import re
+import zlib
+import numpy as np
+from   prompt_budget import count_tokens
+from   configs import *
+
+# end of a sentence: punctuation followed by a capitalized word, or a blank line
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(\[])|\n[ \t]*\n\s*')
+# text without a sentence end for this long is cut at a space
+MAX_SENTENCE_CHARS = 1 << 16
+
+NORMALIZE_RE = re.compile(r'[^a-z0-9]+')
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def iter_sentences(path, block_size=1 << 16):
+    # yields (character offset, sentence) with whitespace collapsed, reading path in blocks
+    offset = 0
+    buffer = ''
+    with open(path, 'r', encoding='utf-8') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            buffer += block
+            last = 0
+            for match in SENTENCE_END_RE.finditer(buffer):
+                # a boundary at the end of the buffer may go on in the next block
+                if match.end() == len(buffer):
+                    break
+                yield from _sentence(offset + last, buffer[last:match.start()])
+                last = match.end()
+            if len(buffer) - last > MAX_SENTENCE_CHARS:
+                cut = buffer.rfind(' ', last, len(buffer) - 1)
+                cut = cut if cut > last else len(buffer)
+                yield from _sentence(offset + last, buffer[last:cut])
+                last = cut
+            offset += last
+            buffer = buffer[last:]
+    yield from _sentence(offset, buffer)
+
+
+def _sentence(offset, text):
+    stripped = text.lstrip()
+    if stripped:
+        yield offset + len(text) - len(stripped), ' '.join(stripped.split())
+
+
+def _split_long(offset, sentence, max_tokens):
+    # (offset, piece) of at most ~max_tokens tokens each, cut between words
+    tokens = count_tokens(sentence)
+    if tokens <= max_tokens:
+        yield offset, sentence
+        return
+    words = sentence.split(' ')
+    step = max(1, len(words) * max_tokens // tokens)
+    for i in range(0, len(words), step):
+        yield offset + len(' '.join(words[:i])) + (1 if i else 0), ' '.join(words[i:i + step])
+
+
+def iter_token_chunks(path, max_tokens=chunk_tokens, overlap_tokens=chunk_overlap_tokens):
+    # yields (character offset, part, text) for every chunk of one file
+    window = []  # (offset, sentence, tokens)
+    size = 0
+    fresh = 0    # sentences in the window that no chunk holds yet
+    part = 0
+    for offset, sentence in iter_sentences(path):
+        for piece_offset, piece in _split_long(offset, sentence, max_tokens):
+            tokens = count_tokens(piece)
+            if fresh and size + tokens > max_tokens:
+                yield window[0][0], part, ' '.join(text for _, text, _ in window)
+                part += 1
+                # carry the last sentences over, as long as they fit the overlap and leave room for this one
+                carried, carried_size = [], 0
+                for item in reversed(window):
+                    if carried_size + item[2] > min(overlap_tokens, max_tokens - tokens):
+                        break
+                    carried.insert(0, item)
+                    carried_size += item[2]
+                window, size, fresh = carried, carried_size, 0
+            window.append((piece_offset, piece, tokens))
+            size += tokens
+            fresh += 1
+    if fresh:
+        yield window[0][0], part, ' '.join(text for _, text, _ in window)
+
+
+# Duplicate detection
+def normalize(text):
+    return NORMALIZE_RE.sub(' ', text.lower()).strip()
+
+
+def content_hash(text):
+    return hashlib.blake2b(normalize(text).encode('utf-8'), digest_size=16).hexdigest()
+
+
+_permutations = {}
+
+
+def _minhash_params(num_perm):
+    if num_perm not in _permutations:
+        rng = np.random.default_rng(1)
+        _permutations[num_perm] = (rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64),
+                                   rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64))
+    return _permutations[num_perm]
+
+
+def minhash(text, num_perm=minhash_perm):
+    # uint32 signature over the word 3-grams of the normalized text
+    words = normalize(text).split()
+    shingles = {' '.join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+    values = np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles], dtype=np.uint64) % MERSENNE_PRIME
+    a, b = _minhash_params(num_perm)
+    return ((a[:, None] * values[None, :] + b[:, None]) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+
+class ChunkDeduper:
+    def __init__(self, threshold=chunk_dedup_threshold, num_perm=minhash_perm, bands=minhash_bands):
+        if num_perm % bands:
+            raise ValueError(f"minhash_perm ({num_perm}) must be a multiple of minhash_bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hashes = {}      # content hash -> id
+        self.signatures = {}  # id -> (content hash, signature)
+        self.buckets = {}     # (band, band bytes) -> {id}
+        self.stats = {'chunks': 0, 'exact': 0, 'near': 0}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def check(self, text):
+        # (kind, id of the kept chunk, content hash, signature); kind is None, 'exact' or 'near'
+        self.stats['chunks'] += 1
+        hash_ = content_hash(text)
+        if hash_ in self.hashes:
+            self.stats['exact'] += 1
+            return 'exact', self.hashes[hash_], hash_, None
+        signature = minhash(text, self.num_perm)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for id_ in candidates:
+            if np.mean(self.signatures[id_][1] == signature) >= self.threshold:
+                self.stats['near'] += 1
+                return 'near', id_, hash_, signature
+        return None, None, hash_, signature
+
+    def add(self, id_, hash_, signature):
+        self.hashes[hash_] = id_
+        self.signatures[id_] = (hash_, signature)
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(id_)
+
+    def remove(self, id_):
+        hash_, signature = self.signatures.pop(id_)
+        if self.hashes.get(hash_) == id_:
+            del self.hashes[hash_]
+        for key in self._band_keys(signature):
+            self.buckets[key].discard(id_)
+
+    def report(self):
+        dropped = self.stats['exact'] + self.stats['near']
+        share = dropped / self.stats['chunks'] if self.stats['chunks'] else 0.0
+        return (f"{self.stats['chunks'] - dropped} of {self.stats['chunks']} chunks kept, {self.stats['exact']} exact and "
+                f"{self.stats['near']} near duplicates dropped ({share:.1%} smaller)")
+
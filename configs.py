@@ -17,4 +17,114 @@ system_message = {
 # Define the model parameters
 context_length = 4096
 num_predict = 100
-repeat_penalty = 1.2
\ No newline at end of file
+repeat_penalty = 1.2
+# Pipeline mode (main.py): overlap download, PDF parsing and summarization
+pipeline_mode = True
+download_workers = 4        # concurrent PDF downloads from arxiv.org
+extract_workers = 4         # processes for PDF-to-text
+llm_concurrency = 2         # in-flight Ollama requests
+pipeline_queue_size = 16    # max items buffered between two stages
+
+# Incremental mode: skip papers whose arXiv version (or PDF hash) was already processed
+incremental_mode = True
+arxiv_api_url = 'https://export.arxiv.org/api/query'
+# Bump whenever extraction, prompts or the model change, to force reprocessing
+pipeline_version = '1'
+
+# Listing crawler: entries per listing page (arxiv.org accepts up to 2000)
+listing_page_size = 2000
+# Set to a date (YYYY-MM-DD) to backfill article_category since that day instead of reading recent only
+article_category = "cs.AI"
+backfill_since = None
+
+# Extracted text cache shared by main.py and save_pdfs.py
+text_cache_db = 'text_cache.db'
+text_cache_max_mb = 1024
+text_cache_store_pdf = False    # also keep the raw PDFs (much larger)
+
+# Shared LLM gateway (llm_gateway.py)
+llm_max_in_flight = 4       # concurrent requests per Ollama host, match OLLAMA_NUM_PARALLEL
+llm_timeout = 300           # seconds per request, excluding time spent waiting for a slot
+llm_retries = 3             # retries on connection errors, timeouts, 429 and 5xx
+llm_backoff = 1.0           # base delay in seconds, doubled on every retry
+
+# Persistent LLM response cache (llm_cache.py)
+llm_cache_enabled = True
+llm_cache_db = 'llm_cache.db'
+llm_cache_ttl = 30 * 24 * 3600  # seconds, 0 keeps entries until evicted by size
+llm_cache_max_mb = 256
+llm_cache_sampled = True        # also cache calls with temperature > 0 (Ollama's default, every call here); False re-samples them
+
+# Classify many summaries per LLM request (funcs.classify_summaries_batched)
+classify_batched = True
+
+# Prompt token budgeting (prompt_budget.py)
+prompt_tokenizer = 'cl100k_base'    # tiktoken encoding used to count tokens
+prompt_token_margin = 0.1           # safety margin, counts are close to but not exactly Llama 3's
+num_ctx_ladder = [2048, 4096, 8192, 16384, 32768]   # num_ctx values requests may use
+
+# Embedding fast path for classification (embedding_classifier.py, needs sentence-transformers)
+classify_embedding = True
+embedding_model_name = 'all-MiniLM-L6-v2'
+embedding_k = 10                # labelled neighbours that vote
+embedding_min_margin = 0.3      # share of the vote the best label must lead by, else ask the LLM
+embedding_min_similarity = 0.5  # cosine similarity to the nearest labelled paper, else ask the LLM
+embedding_min_examples = 50     # labelled papers needed before the fast path is used
+
+# Classification results; incremental mode only classifies summaries without a label for the current prompts/model
+classification_db = 'classification.db'
+incremental_classification = True
+
+# DOAJ keyword extraction (paper_classification/article_scraper.py):
+# 'llm' one request per article, 'batch' many articles per request, 'embedding' no LLM
+keyword_mode = 'batch'
+keyword_batch_ctx = 8192    # max num_ctx of a keyword batch
+
+# Sharded DOAJ clustering (article_scraper.llm_clustering_sharded)
+cluster_shard_ctx = 8192            # max num_ctx per shard
+cluster_merge_threshold = 0.85      # embedding similarity at which two category names are merged
+cluster_confirm_merges = False      # ask the LLM to confirm each merge
+
+# DOAJ scraper (article_scraper.ScraperSession, needs playwright)
+scraper_max_pages = 4       # result pages rendered at the same time
+scraper_timeout = 30        # seconds to wait for a page to load and render
+scraper_retries = 2         # extra attempts for a page that fails to load, then the crawl stops with an error
+
+# HTML extraction backend (html_parsing.py): 'auto', 'selectolax', 'lxml' or 'bs4'
+html_backend = 'auto'
+
+# DOAJ article store (paper_classification/article_store.py), add .gz to compress
+article_store_path = 'articles.jsonl'
+
+# RAG chunk store (chunk_store.py), rebuilt together with faiss_index.bin
+chunk_store_db = 'chunks.db'
+
+# RAG vector index (ann_index.py): 'flat' (exact), 'ivf_flat', 'ivf_pq' or 'hnsw'
+ann_index_type = 'flat'
+ann_nlist = None            # IVF cells, None sizes them from the corpus (~4 sqrt(n))
+ann_pq_m = 48               # IVF-PQ bytes per vector, must divide the embedding size (384)
+ann_hnsw_m = 32             # HNSW links per node
+ann_nprobe = 16             # IVF cells scanned per query, higher is slower and more accurate
+ann_ef_search = 64          # HNSW candidates per query, higher is slower and more accurate
+ann_train_size = 100000     # max vectors used to train IVF indexes
+ann_retrain_factor = 4      # rebuild an IVF index once it holds this many times the vectors it was built with, 0 never
+ann_mmap = True             # open the index memory-mapped and read-only when no update is needed
+
+# Resident RAG engine (python rag.py --serve)
+rag_server_port = 8765
+
+# Embedding cache (embeddings.EmbeddingCache): vectors keyed by chunk hash in <path>.npy + <path>.db
+embedding_cache_path = 'embedding_cache'
+embedding_dtype = 'float16'     # 'float32', 'float16' or 'int8' (scaled by 127, for unit-length vectors)
+embedding_workers = None        # encoder processes, None uses half the CPUs; 1 encodes in-process
+embedding_batch_size = 64       # texts per encode() call, texts are sorted by length to limit padding
+embedding_block = 65536         # vectors read from the cache at a time when building an index
+
+# RAG chunker (chunker.py): sentence-aligned chunks of at most chunk_tokens tokens
+chunk_tokens = 160              # all-MiniLM-L6-v2 truncates its input at 256 word pieces
+chunk_overlap_tokens = 32       # trailing sentences repeated at the start of the next chunk
+chunk_dedup = True              # drop exact and near-duplicate chunks before embedding
+chunk_dedup_threshold = 0.85    # MinHash-estimated Jaccard similarity (word 3-grams) of a near duplicate
+minhash_perm = 64               # MinHash signature length
+minhash_bands = 16              # LSH bands, minhash_perm must be a multiple
+rag_prefer_clean = True         # index clean_<paper>.txt (save_pdfs.py) instead of <paper>.txt when both exist
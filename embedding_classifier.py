@@ -0,0 +1,146 @@
+# Embedding fast path for the two-level classification
+#
+# Summaries are embedded with the same sentence-transformers model rag.py uses
+# (all-MiniLM-L6-v2) and labelled by a similarity-weighted k-NN vote over papers
+# the LLM already classified. Only summaries whose vote is not clear enough
+# (margin between the two best labels, or similarity to the nearest labelled
+# paper, below the thresholds in configs.py) go to the LLM; their labels are
+# then added to the index, so the fast path covers more of the feed every run.
+#
+# Labelled embeddings are stored next to the labels in classification.db
+# (label_embeddings), one row per url and embedding model, so a run only embeds
+# new summaries. Fast-path labels are not added back, to keep the index anchored
+# to LLM decisions.
+#
+# Requires: pip install -U sentence-transformers
+
+import numpy as np
+from   configs import *
+from   funcs import classify_summaries_batched, classify_summaries_with_two_layers
+from   embeddings import embeddings_available, load_embedding_model
+
+
+class EmbeddingClassifier:
+    def __init__(self, conn, model_name=embedding_model_name, k=embedding_k,
+                 min_margin=embedding_min_margin, min_similarity=embedding_min_similarity,
+                 min_examples=embedding_min_examples):
+        # conn: classification.db connection (see funcs.init_classification_db)
+        self.conn = conn
+        self.model_name = model_name
+        self.k = k
+        self.min_margin = min_margin
+        self.min_similarity = min_similarity
+        self.min_examples = min_examples
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS label_embeddings (
+                url TEXT,
+                model TEXT,
+                level1 TEXT,
+                level2 TEXT,
+                embedding BLOB,
+                PRIMARY KEY (url, model)
+            )
+        ''')
+        self.conn.commit()
+        rows = self.conn.execute('SELECT url, level1, level2, embedding FROM label_embeddings WHERE model = ?',
+                                 (model_name,)).fetchall()
+        self.urls = [url for url, _, _, _ in rows]
+        self.labels = [(level1, level2) for _, level1, level2, _ in rows]
+        self.vectors = np.array([np.frombuffer(blob, dtype=np.float32) for _, _, _, blob in rows], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def embed(self, texts):
+        # unit-length float32 rows, so a dot product is the cosine similarity
+        vectors = load_embedding_model(self.model_name).encode(list(texts), batch_size=64, convert_to_numpy=True,
+                                                               normalize_embeddings=True, show_progress_bar=False)
+        return vectors.astype(np.float32)
+
+    def bootstrap(self, summaries_conn, debug=False):
+        # embed labelled papers from the classifications table that are not indexed yet
+        labelled = self.conn.execute('SELECT url, level1, level2 FROM classifications').fetchall()
+        indexed = set(self.urls)
+        missing = {url: (level1, level2) for url, level1, level2 in labelled
+                   if url not in indexed and level1 != 'Others'}
+        if not missing:
+            return 0
+        rows = summaries_conn.execute('SELECT url, summary FROM summaries').fetchall()
+        rows = [(url, summary) for url, summary in rows if url in missing and summary]
+        if rows:
+            self.add([url for url, _ in rows], self.embed(summary for _, summary in rows),
+                     [missing[url] for url, _ in rows])
+        if debug:
+            print(f"DEBUG: Indexed {len(rows)} previously classified summaries ({len(self)} in total)")
+        return len(rows)
+
+    def add(self, urls, vectors, labels):
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO label_embeddings (url, model, level1, level2, embedding)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(url, self.model_name, level1, level2, vector.tobytes())
+              for url, vector, (level1, level2) in zip(urls, vectors, labels)])
+        self.conn.commit()
+        # replaced urls keep their old row in memory until the next load; the vote barely changes
+        self.urls.extend(urls)
+        self.labels.extend(labels)
+        self.vectors = np.vstack([self.vectors.reshape(-1, vectors.shape[1]), vectors]) if len(self.vectors) else vectors
+
+    def predict(self, vectors):
+        # [(label or None, margin)]; None when the index is too small or the vote is unclear
+        if len(self) < self.min_examples:
+            return [(None, 0.0)] * len(vectors)
+        k = min(self.k, len(self))
+        similarities = vectors @ self.vectors.T
+        neighbours = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+        predictions = []
+        for row, indices in zip(similarities, neighbours):
+            votes = {}
+            for index in indices:
+                votes[self.labels[index]] = votes.get(self.labels[index], 0.0) + max(float(row[index]), 0.0)
+            ranked = sorted(votes.items(), key=lambda item: item[1], reverse=True)
+            total = sum(votes.values()) or 1.0
+            margin = (ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0.0)) / total
+            confident = margin >= self.min_margin and float(row[indices].max()) >= self.min_similarity
+            predictions.append((ranked[0][0] if confident else None, margin))
+        return predictions
+
+
+def classify_summaries_embedding(api_url, summaries, classifier, debug=False):
+    # Same result shape as classify_summaries_with_two_layers; the LLM only sees the
+    # summaries the k-NN vote is unsure about.
+    if not summaries:
+        return {}, {}
+    vectors = classifier.embed(content for _, content in summaries)
+    url_classifications = {}
+    uncertain, uncertain_vectors = [], []
+    for (url, content), vector, (label, margin) in zip(summaries, vectors, classifier.predict(vectors)):
+        if label is None:
+            uncertain.append((url, content))
+            uncertain_vectors.append(vector)
+        else:
+            url_classifications[url] = label
+    if debug:
+        print(f"DEBUG: {len(url_classifications)} summaries classified by embeddings, {len(uncertain)} sent to the LLM")
+
+    if uncertain:
+        if classify_batched:
+            _, llm_classifications = classify_summaries_batched(api_url, uncertain, debug=debug)
+        else:
+            _, llm_classifications = classify_summaries_with_two_layers(api_url, uncertain)
+        url_classifications.update(llm_classifications)
+        # feed the new LLM labels back, except failures
+        learned = [(url, vector) for (url, _), vector in zip(uncertain, uncertain_vectors)
+                   if llm_classifications[url] != ('Others', 'Others')]
+        if learned:
+            classifier.add([url for url, _ in learned], np.array([vector for _, vector in learned]),
+                           [llm_classifications[url] for url, _ in learned])
+
+    category_counts = {}
+    for url, _ in summaries:
+        key = url_classifications[url]
+        category_counts[key] = category_counts.get(key, 0) + 1
+    print(f"Classified {len(summaries)} summaries: {len(summaries) - len(uncertain)} by embeddings, "
+          f"{len(uncertain)} by the LLM ({len(classifier)} labelled papers indexed).")
+    return category_counts, url_classifications
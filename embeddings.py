@@ -0,0 +1,202 @@
+# Sentence-transformers models shared by rag.py and embedding_classifier.py
+#
+# Models are loaded on first use and then kept for the life of the process, so
+# importing a module that embeds text costs nothing until it actually does.
+#
+# EmbeddingCache keeps every chunk embedding on disk, keyed by a hash of the
+# chunk text: <path>.npy is a memory-mapped matrix (float16 or int8 to halve or
+# quarter it), <path>.db maps hashes to rows. Rebuilding an index or trying
+# another index type only encodes chunks that were never seen, and the matrix
+# is read back in blocks, so it never has to fit in RAM. Missing chunks are
+# encoded by a pool of worker processes, each with its own copy of the model.
+#
+# Requires: pip install -U sentence-transformers
+
+import hashlib
+import os
+import sqlite3
+import multiprocessing
+from   concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from   configs import *
+
+_models = {}
+
+DTYPES = ['float32', 'float16', 'int8']
+INT8_SCALE = 127.0
+
+
+def load_embedding_model(model_name=embedding_model_name):
+    # loaded once per process, on first use
+    if model_name not in _models:
+        from sentence_transformers import SentenceTransformer
+        _models[model_name] = SentenceTransformer(model_name)
+    return _models[model_name]
+
+
+def embeddings_available():
+    try:
+        import sentence_transformers  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+# Worker processes: one model each, CPU threads split between them
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_embedding_model(model_name)
+
+
+def _encode_batch(texts, batch_size):
+    return np.asarray(_worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+
+
+def encode_parallel(texts, model_name=embedding_model_name, workers=None, batch_size=embedding_batch_size):
+    # yields (positions, float32 vectors) as batches finish; texts are encoded longest first
+    # so each batch pads to similar lengths, positions point back into texts
+    workers = workers or embedding_workers or default_workers()
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    # a few batches per task, so the parent writes results while workers keep encoding
+    task = batch_size * 4
+    tasks = [order[i:i + task] for i in range(0, len(order), task)]
+    if workers <= 1 or len(tasks) <= 1:
+        model = load_embedding_model(model_name)
+        for positions in tasks:
+            yield positions, np.asarray(model.encode([texts[i] for i in positions], batch_size=batch_size,
+                                                     show_progress_bar=False), dtype=np.float32)
+        return
+    # spawn, not fork: a forked copy of a parent that already ran torch can deadlock
+    threads = max(1, (os.cpu_count() or workers) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(model_name, threads)) as executor:
+        batches = executor.map(_encode_batch, ([texts[i] for i in positions] for positions in tasks),
+                               [batch_size] * len(tasks))
+        for positions, vectors in zip(tasks, batches):
+            yield positions, vectors
+
+
+class EmbeddingCache:
+    def __init__(self, path=embedding_cache_path, model_name=embedding_model_name, dtype=embedding_dtype):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {dtype}, expected one of {DTYPES}")
+        self.path = path
+        self.matrix_path = f'{path}.npy'
+        self.model_name = model_name
+        self.dtype = dtype
+        self.conn = sqlite3.connect(f'{path}.db', check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, row INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        stored = dict(self.conn.execute('SELECT key, value FROM meta').fetchall())
+        if stored and (stored.get('model'), stored.get('dtype')) != (model_name, dtype):
+            # vectors of another model or precision cannot be mixed in, start over
+            print(f"Embedding cache {path} holds {stored.get('model')} {stored.get('dtype')} vectors, "
+                  f"clearing it for {model_name} {dtype}.")
+            self.conn.execute('DELETE FROM rows')
+            if os.path.exists(self.matrix_path):
+                os.remove(self.matrix_path)
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('model', model_name))
+        self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('dtype', dtype))
+        self.conn.commit()
+        self.matrix = np.load(self.matrix_path, mmap_mode='r+') if os.path.exists(self.matrix_path) else None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    @property
+    def dimension(self):
+        return None if self.matrix is None else self.matrix.shape[1]
+
+    def lookup(self, hashes):
+        # cache row of every hash, -1 when it has not been embedded yet
+        rows = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), 500):
+            part = hashes[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            rows.update(self.conn.execute(f'SELECT hash, row FROM rows WHERE hash IN ({placeholders})', part))
+        return np.array([rows.get(hash_, -1) for hash_ in hashes], dtype=np.int64)
+
+    def _reserve(self, rows, dimension):
+        # grow the .npy file (capacity doubles) so it can hold `rows` vectors
+        capacity = 0 if self.matrix is None else self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        grown = np.lib.format.open_memmap(self.matrix_path + '.tmp', mode='w+', dtype=self.dtype,
+                                          shape=(max(rows, 2 * capacity, 1024), dimension))
+        for start in range(0, capacity, embedding_block):
+            end = min(start + embedding_block, capacity)
+            grown[start:end] = self.matrix[start:end]
+        grown.flush()
+        del grown
+        self.matrix = None
+        os.replace(self.matrix_path + '.tmp', self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode='r+')
+
+    def _quantize(self, vectors):
+        if self.dtype == 'int8':
+            return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+        return vectors.astype(self.dtype)
+
+    def embed(self, texts, workers=None, batch_size=embedding_batch_size, debug=False):
+        # cache rows of all texts, encoding (in parallel) only the ones not cached yet
+        hashes = [text_hash(text) for text in texts]
+        rows = self.lookup(hashes)
+        missing = {}
+        for position in np.flatnonzero(rows < 0):
+            missing.setdefault(hashes[position], position)
+        if debug:
+            print(f"DEBUG: Embedding cache: {len(texts) - int((rows < 0).sum())} of {len(texts)} chunks cached, "
+                  f"encoding {len(missing)}.")
+        if missing:
+            new_texts = [texts[position] for position in missing.values()]
+            new_hashes = list(missing)
+            first_row = next_row = self.conn.execute('SELECT COALESCE(MAX(row) + 1, 0) FROM rows').fetchone()[0]
+            try:
+                # batches are appended in the order they finish, one contiguous write each
+                for positions, vectors in encode_parallel(new_texts, self.model_name, workers, batch_size):
+                    self._reserve(first_row + len(new_texts), vectors.shape[1])
+                    self.matrix[next_row:next_row + len(vectors)] = self._quantize(vectors)
+                    self.conn.executemany('INSERT INTO rows (hash, row) VALUES (?, ?)',
+                                          [(new_hashes[p], next_row + i) for i, p in enumerate(positions)])
+                    next_row += len(vectors)
+                # vectors first, then the rows pointing at them
+                self.matrix.flush()
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            rows = self.lookup(hashes)
+        return rows
+
+    def vectors(self, rows):
+        # float32 vectors for the given rows
+        vectors = np.asarray(self.matrix[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+        return vectors / INT8_SCALE if self.dtype == 'int8' else vectors
+
+    def iter_vectors(self, rows, block=embedding_block):
+        # (start, float32 vectors) for rows[start:start + block], reading the matrix one block at a time
+        for start in range(0, len(rows), block):
+            yield start, self.vectors(rows[start:start + block])
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.matrix = None
+        self.conn.close()
@@ -1,62 +1,196 @@
 
-from bs4 import BeautifulSoup
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import io
+import hashlib
 import sqlite3
-from ollama import Client
+import xml.etree.ElementTree as ET
 from datetime import datetime
 from configs import *
+from sections import parse_sections
+from html_parsing import parse_arxiv_listing
+from llm_gateway import get_gateway, stop_after_first_line
+from prompt_budget import choose_num_ctx, content_budget, count_tokens, fits, message_tokens, trim_to_tokens
 
 # Data Processing
+_session = None
+
+def make_session(pool_maxsize=10, retries=3):
+    # keep-alive connection pool with retries/backoff on transient errors
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    # shared session, so a crawl reuses one connection pool
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+
+def init_listing_cache(conn):
+    # validators and body of every listing page, for conditional requests
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS listing_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body TEXT
+        )
+    ''')
+    conn.commit()
+
+def fetch_listing_page(url, params, session, conn=None):
+    # returns page HTML, answering from listing_cache when the server says 304 Not Modified
+    page_url = requests.Request('GET', url, params=params).prepare().url
+    cached = None
+    headers = {}
+    if conn is not None:
+        cached = conn.execute('SELECT etag, last_modified, body FROM listing_cache WHERE url = ?', (page_url,)).fetchone()
+        if cached:
+            if cached[0]:
+                headers['If-None-Match'] = cached[0]
+            if cached[1]:
+                headers['If-Modified-Since'] = cached[1]
+
+    response = session.get(page_url, headers=headers, timeout=60)
+    if response.status_code == 304 and cached:
+        return cached[2]
+    response.raise_for_status()
+
+    if conn is not None:
+        conn.execute('''
+            INSERT OR REPLACE INTO listing_cache (url, etag, last_modified, body)
+            VALUES (?, ?, ?, ?)
+        ''', (page_url, response.headers.get('ETag'), response.headers.get('Last-Modified'), response.text))
+        conn.commit()
+    return response.text
+
+def parse_listing_page(html):
+    # yields (pdf_link, listing_date) in page order; listing_date is None on pages without day headers
+    yield from parse_arxiv_listing(html)
+
+def iter_arxiv_pdf_links(url, since=None, show=listing_page_size, session=None, conn=None, debug=False):
+    # walk a listing page by page (skip/show), yielding links as they are parsed;
+    # stops at the first entry announced before `since`
+    session = session or get_session()
+    if conn is not None:
+        init_listing_cache(conn)
+    skip = 0
+    while True:
+        try:
+            html = fetch_listing_page(url, {'skip': skip, 'show': show}, session, conn)
+        except requests.exceptions.RequestException as e:
+            print(f"Error: {e}")
+            return
+
+        n_links = 0
+        for link, listing_date in parse_listing_page(html):
+            if since is not None and listing_date is not None and listing_date < since:
+                return
+            n_links += 1
+            yield link
+        if debug:
+            print(f"DEBUG: {url} skip={skip}: {n_links} links")
+        if n_links < show:
+            return
+        skip += show
+
+def backfill_arxiv_pdf_links(category, since, session=None, conn=None, debug=False):
+    # recent submissions first, then the monthly archives back to the month of `since`;
+    # monthly pages have no day headers, so the oldest month is returned whole
+    session = session or get_session()
+    seen = set()
+    listings = [(f'https://arxiv.org/list/{category}/recent', since)]
+    year, month = datetime.now().year, datetime.now().month
+    while (year, month) >= (since.year, since.month):
+        listings.append((f'https://arxiv.org/list/{category}/{year:04d}-{month:02d}', None))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+
+    for url, stop_date in listings:
+        for link in iter_arxiv_pdf_links(url, since=stop_date, session=session, conn=conn, debug=debug):
+            if link not in seen:
+                seen.add(link)
+                yield link
+
 def get_arxiv_pdf_links(url):
-    try:
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # find article ids
-            articles_dl = soup.find('dl', id='articles')
-            if articles_dl:
-                return [
-                    f'https://arxiv.org/pdf/{a_tag.get("id")}'
-                    for a_tag in articles_dl.find_all('a', title="Abstract")
-                    if a_tag.get('id')
-                ]
-            else:
-                print("Didn't find articles'id tags...")
-                return []
-        else:
-            print(f"Request failed with status code: {response.status_code}")
-            return []
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Error: {e}")
-        return []
+    links = list(iter_arxiv_pdf_links(url))
+    if not links:
+        print("Didn't find articles'id tags...")
+    return links
 
 
-def extract_abstract_section(text):
-    # start with "Abstract", end with 2 \n
-    match = re.search(r'A(?i)bstract\s*(.*?)\n{2,}', text, re.DOTALL)
-    
-    if match:
-        abstract_text = match.group(1).replace('\n', ' ').strip()
-        return abstract_text
+def download_pdf(url, session=None):
+    response = (session or get_session()).get(url, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+def pdf_to_text(pdf_bytes):
+    # same pdfminer conversion as arxiv2text.arxiv_to_text, minus the download,
+    # so parsing can run in a separate (CPU) worker pool
+    from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfpage import PDFPage
 
-    return ""
+    resource_manager = PDFResourceManager()
+    text_stream = io.StringIO()
+    device = TextConverter(resource_manager, text_stream, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resource_manager, device)
+    for page in PDFPage.get_pages(io.BytesIO(pdf_bytes)):
+        interpreter.process_page(page)
+
+    extracted_text = text_stream.getvalue()
+    text_stream.close()
+    return extracted_text
+
+
+def extract_abstract_section(text):
+    # start with "Abstract", end with 2 \n (see sections.parse_sections)
+    return parse_sections(text)['abstract']
 
 
 # Bot responses
-def bot_response (messages, api_url):
-    client = Client(host=api_url)
+SUMMARY_PROMPT = """Extract the key takeaways from the following research summary in exactly 50 words or less. 
+                        Provide only the summary text without any additional explanation:\n\n{payload_text}"""
+
+def build_summary_messages(payload_text):
+    # trim the abstract to the room left in context_length next to the instructions and the answer
+    template_tokens = message_tokens([system_message, {'content': SUMMARY_PROMPT.format(payload_text='')}])
+    payload_text = trim_to_tokens(payload_text, content_budget(template_tokens, num_predict, context_length))
+    user_message = {
+        'role': 'user',
+            'content': SUMMARY_PROMPT.format(payload_text=payload_text)
+    }
+    return [system_message, user_message]
+
+def bot_response (messages, api_url, stop=None, fresh=False, valid=None):
+    # with a stop condition the answer is streamed and cut off once stop(text) holds;
+    # fresh and valid control the response cache (see LLMGateway._call)
+    client = get_gateway(api_url)
+    options = {
+        # smallest context that holds the prompt and the answer
+        'num_ctx': choose_num_ctx(message_tokens(messages), num_predict, context_length),
+        'num_predict': num_predict,
+        'repeat_penalty': repeat_penalty,
+    }
+    if stop is not None:
+        return client.chat_until(model='llama3.2', messages=messages, stop=stop, options=options, fresh=fresh,
+                                 valid=valid)
     response = client.chat(
         model='llama3.2',
         messages=messages,
-        options={
-            'num_ctx': context_length,
-            'num_predict': num_predict,
-            'repeat_penalty': repeat_penalty,
-        }
+        options=options,
+        fresh=fresh,
+        valid=valid
     )
     return response['message']['content']
 
@@ -89,7 +223,7 @@ def classify_summaries(api_url, summaries):
         messages = [user_message]
         
         # use model to generate classification
-        category = bot_response(messages, api_url).strip()
+        category = bot_response(messages, api_url, stop=stop_after_first_line).strip()
         
         # keep only tokens as result
         category = category.split('\n')[0].split(" or ")[0].strip()
@@ -102,11 +236,19 @@ def classify_summaries(api_url, summaries):
     return category_counts
 
 
-def classify_summaries_with_two_layers(api_url, summaries):
-    category_counts = {}
-    url_classifications = {}  # record classifications for each url
+# Few-shot examples shared by the single and the batched two-level prompts
+TWO_LEVEL_EXAMPLES = """
+    - For a paper on improving image classification models, return: Computer Vision: Image Classification
+    - For a paper on training agents using rewards, return: Machine Learning: Reinforcement Learning
+    - For a paper on summarizing clinical notes, return: Natural Language Processing: Clinical Text Summarization
+    - For a paper on new techniques in entity extraction from text, return: Natural Language Processing: Information Extraction
+    - For a paper on the use of robots in agriculture, return: Robotics: Agricultural Robots
+    - For a paper on adversarial attacks on neural networks, return: Machine Learning: Adversarial Machine Learning
+    - For a paper on optimizing hyperparameters in deep learning models, return: Machine Learning: Hyperparameter Tuning
+    - For a paper on improving speech recognition, return: Speech Processing: Automatic Speech Recognition
+    - For a paper on detecting vulnerabilities in software systems, return: Software Engineering: Software Security"""
 
-    prompt_template = """
+TWO_LEVEL_PROMPT = """
     You are an AI model that classifies research papers into two levels of categories: a broad category (Level 1) and a more specific subcategory (Level 2).
     For each research summary, provide:
     1. A broad category that best fits the content, such as "Machine Learning", "Computer Vision", "Natural Language Processing", "Robotics", etc.
@@ -117,15 +259,7 @@ def classify_summaries_with_two_layers(api_url, summaries):
     Here are some examples of how to classify research papers:
 
     Examples:
-    - For a paper on improving image classification models, return: Computer Vision: Image Classification
-    - For a paper on training agents using rewards, return: Machine Learning: Reinforcement Learning
-    - For a paper on summarizing clinical notes, return: Natural Language Processing: Clinical Text Summarization
-    - For a paper on new techniques in entity extraction from text, return: Natural Language Processing: Information Extraction
-    - For a paper on the use of robots in agriculture, return: Robotics: Agricultural Robots
-    - For a paper on adversarial attacks on neural networks, return: Machine Learning: Adversarial Machine Learning
-    - For a paper on optimizing hyperparameters in deep learning models, return: Machine Learning: Hyperparameter Tuning
-    - For a paper on improving speech recognition, return: Speech Processing: Automatic Speech Recognition
-    - For a paper on detecting vulnerabilities in software systems, return: Software Engineering: Software Security
+""" + TWO_LEVEL_EXAMPLES.strip('\n') + """
 
     Now classify the following research summary:
     {content}
@@ -133,6 +267,12 @@ def classify_summaries_with_two_layers(api_url, summaries):
     Category:
     """
 
+def classify_summaries_with_two_layers(api_url, summaries):
+    category_counts = {}
+    url_classifications = {}  # record classifications for each url
+
+    prompt_template = TWO_LEVEL_PROMPT
+
     for url, content in summaries:
         user_message = {
             'role': 'user',
@@ -146,7 +286,10 @@ def classify_summaries_with_two_layers(api_url, summaries):
         attempts = 0
 
         while (level1 is None or level2 is None) and attempts < max_attempts:
-            response = bot_response(messages, api_url).strip()
+            # a retry asks the model again instead of getting the cached answer back, and
+            # answers that do not parse are never cached
+            response = bot_response(messages, api_url, stop=stop_after_two_level, fresh=attempts > 0,
+                                    valid=lambda text: None not in parse_two_level_response(text.strip())).strip()
             level1, level2 = parse_two_level_response(response)
 
             # if failed to classify, add attempt
@@ -174,16 +317,145 @@ def classify_summaries_with_two_layers(api_url, summaries):
 
 def parse_two_level_response(response):
     """
-    covert responses into 2 levels
+    covert responses into 2 levels (first line holding a ':')
     """
-    if ':' in response:
-        level1, level2 = response.split(':', 1)
-        return level1.strip(), level2.strip()
+    for line in response.splitlines():
+        if ':' in line:
+            level1, level2 = line.split(':', 1)
+            return level1.strip(), level2.strip()
     return None, None
 
+def stop_after_two_level(text):
+    # stop streaming once the first line holds a complete "Level 1: Level 2"
+    return stop_after_first_line(text) and ':' in text.lstrip().split('\n', 1)[0]
+
 
 
 
+TWO_LEVEL_BATCH_PROMPT = """
+    You are an AI model that classifies research papers into two levels of categories: a broad category (Level 1) and a more specific subcategory (Level 2).
+    I will provide you with several research summaries separated by three dashes (---). Each one starts with its ID on its own line.
+    For each research summary, provide:
+    1. A broad category that best fits the content, such as "Machine Learning", "Computer Vision", "Natural Language Processing", "Robotics", etc.
+    2. A more specific subcategory within that broad category, such as "Reinforcement Learning" under "Machine Learning".
+
+    Return exactly one line per summary in the format: ID|Level 1: Level 2. Do not provide any additional explanations or options.
+
+    Here are some examples of how to classify research papers:
+
+    Examples:
+{examples}
+
+    Example Output:
+    1a2b3c4d|Computer Vision: Image Classification
+    5e6f7a8b|Machine Learning: Reinforcement Learning
+
+    Now classify the following research summaries:
+{items}
+
+    Categories:
+    """
+
+# Output tokens reserved per summary in a batch ("1a2b3c4d|Level 1: Level 2")
+BATCH_TOKENS_PER_ITEM = 24
+
+BATCH_LINE_RE = re.compile(r'^\W*(?:ID:?\s*)?([0-9a-f]{8})\s*\|\s*(.+)$')
+
+
+def summary_id(url, taken=()):
+    # short, stable id for a url; re-hashed on the rare collision within a batch
+    salt = 0
+    while True:
+        id_ = hashlib.md5(f'{url}{salt or ""}'.encode()).hexdigest()[:8]
+        if id_ not in taken:
+            return id_
+        salt += 1
+
+def pack_batches(summaries, max_tokens, max_items=None):
+    # greedily fill batches while prompt + reserved output fit in max_tokens
+    overhead = message_tokens([{'content': TWO_LEVEL_BATCH_PROMPT.format(examples=TWO_LEVEL_EXAMPLES, items='')}])
+    batches, batch, used = [], [], overhead
+    for url, content in summaries:
+        # "1a2b3c4d\n<content>\n---\n"
+        cost = count_tokens(content) + 8
+        full = max_items and len(batch) >= max_items
+        if batch and (full or not fits(used + cost, BATCH_TOKENS_PER_ITEM * (len(batch) + 1), max_tokens)):
+            batches.append(batch)
+            batch, used = [], overhead
+        batch.append((url, content))
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def parse_batch_response(response, ids):
+    # {url: (level1, level2)} for every well-formed "id|Level 1: Level 2" line with a known id
+    parsed = {}
+    for line in response.splitlines():
+        match = BATCH_LINE_RE.match(line.strip())
+        if not match or match.group(1) not in ids:
+            continue
+        level1, level2 = parse_two_level_response(match.group(2))
+        if level1 and level2:
+            parsed[ids[match.group(1)]] = (level1, level2)
+    return parsed
+
+def classify_summaries_batched(api_url, summaries, max_tokens=context_length, debug=False):
+    # Same result shape as classify_summaries_with_two_layers, but many summaries per request.
+    # Summaries whose line is missing or malformed are re-queued in batches half the size,
+    # down to the single-summary prompt (with its retries and "Others" fallback).
+    url_classifications = {}
+    pending = list(summaries)
+    max_items = None
+    gateway = get_gateway(api_url)
+    # requests the server actually got, retries included (cache hits are not requests)
+    requests_before = gateway.stats['requests']
+
+    while pending and max_items != 1:
+        batches = pack_batches(pending, max_tokens, max_items)
+        calls, batch_ids = [], []
+        for batch in batches:
+            ids = {}
+            for url, _ in batch:
+                ids[summary_id(url, ids)] = url
+            items = '\n---\n'.join(f'{id_}\n{content}' for id_, (_, content) in zip(ids, batch))
+            messages = [{'role': 'user', 'content': TWO_LEVEL_BATCH_PROMPT.format(examples=TWO_LEVEL_EXAMPLES, items=items)}]
+            batch_predict = BATCH_TOKENS_PER_ITEM * len(batch)
+            options = {
+                'num_ctx': choose_num_ctx(message_tokens(messages), batch_predict, max_tokens),
+                'num_predict': batch_predict,
+                'repeat_penalty': repeat_penalty,
+            }
+            # only cache answers that classify the whole batch
+            calls.append(dict(model='llama3.2', messages=messages, options=options,
+                              valid=lambda text, ids=ids: len(parse_batch_response(text, ids)) == len(ids)))
+            batch_ids.append(ids)
+
+        # batches of one round run concurrently through the gateway
+        responses = gateway.chat_many(calls)
+        failed = []
+        for batch, ids, response in zip(batches, batch_ids, responses):
+            parsed = parse_batch_response(response['message']['content'], ids)
+            url_classifications.update(parsed)
+            failed.extend(item for item in batch if item[0] not in parsed)
+        if debug:
+            print(f"DEBUG: {len(batches)} batches, {len(pending) - len(failed)} classified, {len(failed)} re-queued")
+
+        pending = failed
+        max_items = max(1, max(len(batch) for batch in batches) // 2)
+
+    if pending:
+        _, single = classify_summaries_with_two_layers(api_url, pending)
+        url_classifications.update(single)
+
+    category_counts = {}
+    for url, _ in summaries:
+        key = url_classifications[url]
+        category_counts[key] = category_counts.get(key, 0) + 1
+    print(f"Classified {len(summaries)} summaries in {gateway.stats['requests'] - requests_before} LLM requests.")
+    return category_counts, url_classifications
+
+
 # Database
 def init_db(db_name):
     conn = sqlite3.connect(db_name)
@@ -196,6 +468,17 @@ def init_db(db_name):
             created_date TEXT
         )
     ''')
+    # per-url manifest for incremental runs
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS manifest (
+            url TEXT PRIMARY KEY,
+            arxiv_id TEXT,
+            version INTEGER,
+            content_hash TEXT,
+            pipeline_version TEXT,
+            updated_date TEXT
+        )
+    ''')
     conn.commit()
     return conn
 
@@ -217,23 +500,91 @@ def get_summary_from_db(conn, url, columns):
     result = cursor.fetchone()
     return result if result else None
 
-def fetch_all_summaries(conn, columns, table):
+def fetch_all_summaries(conn, columns, table='summaries'):
     columns_str = ', '.join(columns)
-    query = f'SELECT {columns_str} FROM summaries'
+    query = f'SELECT {columns_str} FROM {table}'
 
     cursor = conn.cursor()
     cursor.execute(query)
     results = cursor.fetchall()
     return results
 
+# Incremental ingestion
+def arxiv_id_from_url(url):
+    # https://arxiv.org/pdf/2411.04991v2 -> 2411.04991
+    return re.sub(r'v\d+$', '', url.rstrip('/').split('/')[-1])
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def get_arxiv_versions(arxiv_ids, batch_size=100, session=None):
+    # the export API returns the latest version of up to batch_size papers per request,
+    # much cheaper than touching every PDF
+    session = session or get_session()
+    versions = {}
+    atom = '{http://www.w3.org/2005/Atom}'
+    for i in range(0, len(arxiv_ids), batch_size):
+        batch = arxiv_ids[i:i + batch_size]
+        try:
+            response = session.get(arxiv_api_url, params={'id_list': ','.join(batch), 'max_results': len(batch)}, timeout=60)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Version lookup failed, falling back to content hashes: {e}")
+            continue
+        for entry in ET.fromstring(response.content).iter(f'{atom}entry'):
+            match = re.search(r'/abs/(.+)v(\d+)$', entry.findtext(f'{atom}id', ''))
+            if match:
+                versions[match.group(1)] = int(match.group(2))
+    return versions
+
+def load_manifest(conn):
+    cursor = conn.cursor()
+    cursor.execute('SELECT url, version, content_hash, pipeline_version FROM manifest')
+    return {url: (version, hash_, pipeline) for url, version, hash_, pipeline in cursor.fetchall()}
+
+def is_unchanged(entry, version=None, hash_=None):
+    # entry is a load_manifest() value; a paper is unchanged if it went through the
+    # current pipeline version and either its arXiv version or its PDF hash still match
+    if entry is None:
+        return False
+    old_version, old_hash, old_pipeline = entry
+    if old_pipeline != pipeline_version:
+        return False
+    if version is not None and old_version == version:
+        return True
+    return hash_ is not None and old_hash == hash_
+
+def update_manifest(conn, url, version, hash_):
+    cursor = conn.cursor()
+    current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M')
+    cursor.execute('''
+        INSERT OR REPLACE INTO manifest (url, arxiv_id, version, content_hash, pipeline_version, updated_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (url, arxiv_id_from_url(url), version, hash_, pipeline_version, current_datetime))
+    conn.commit()
+
+def select_changed_urls(conn, urls):
+    # returns the urls that need processing plus the lookups needed to finish the check after download
+    manifest = load_manifest(conn)
+    id_versions = get_arxiv_versions([arxiv_id_from_url(url) for url in urls])
+    versions = {url: id_versions.get(arxiv_id_from_url(url)) for url in urls}
+    changed = [url for url in urls if not is_unchanged(manifest.get(url), versions[url])]
+    print(f"Incremental run: {len(urls) - len(changed)} unchanged, {len(changed)} new or revised")
+    return changed, versions, manifest
+
 def delete_table(conn):
     cursor = conn.cursor()
     cursor.execute('DROP TABLE IF EXISTS summaries')
     conn.commit()
     conn.close()
 
-def init_classification_db():
-    conn = sqlite3.connect('classification.db')
+def classification_version():
+    # labels are only reused while the model and the classification prompts stay the same
+    key = '\n'.join(['llama3.2', TWO_LEVEL_PROMPT, TWO_LEVEL_BATCH_PROMPT, TWO_LEVEL_EXAMPLES])
+    return hashlib.md5(key.encode()).hexdigest()[:12]
+
+def init_classification_db(db_name=classification_db):
+    conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS classifications (
@@ -242,13 +593,73 @@ def init_classification_db():
             level2 TEXT
         )
     ''')
+    # databases from before incremental classification lack these columns
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(classifications)')]
+    for column in ('version', 'summary_date', 'classified_date'):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE classifications ADD COLUMN {column} TEXT')
+    # materialized (level1, level2) -> count, kept in step with classifications
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_counts (
+            level1 TEXT,
+            level2 TEXT,
+            count INTEGER,
+            PRIMARY KEY (level1, level2)
+        )
+    ''')
+    if cursor.execute('SELECT COUNT(*) FROM category_counts').fetchone()[0] == 0:
+        rebuild_category_counts(conn)
     conn.commit()
     return conn
 
-def insert_classification(conn, url, level1, level2):
+def rebuild_category_counts(conn):
+    with conn:
+        conn.execute('DELETE FROM category_counts')
+        conn.execute('''
+            INSERT INTO category_counts (level1, level2, count)
+            SELECT level1, level2, COUNT(*) FROM classifications GROUP BY level1, level2
+        ''')
+
+def fetch_unclassified_summaries(conn, db_name=classification_db):
+    # (url, summary) pairs with no label for the current classification_version(),
+    # or whose summary was regenerated after it was classified
+    conn.execute('ATTACH DATABASE ? AS labels', (db_name,))
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.url, s.summary FROM summaries s
+            LEFT JOIN labels.classifications c ON c.url = s.url
+            WHERE c.url IS NULL OR c.version IS NOT ? OR c.summary_date IS NOT s.created_date
+        ''', (classification_version(),))
+        return cursor.fetchall()
+    finally:
+        conn.execute('DETACH DATABASE labels')
+
+def save_classifications(conn, url_classifications, summary_dates=None):
+    # upsert labels and adjust category_counts in one transaction
+    summary_dates = summary_dates or {}
+    version = classification_version()
+    current_datetime = datetime.now().strftime('%Y-%m-%d %H:%M')
+    with conn:
+        for url, (level1, level2) in url_classifications.items():
+            old = conn.execute('SELECT level1, level2 FROM classifications WHERE url = ?', (url,)).fetchone()
+            if old:
+                conn.execute('UPDATE category_counts SET count = count - 1 WHERE level1 = ? AND level2 = ?', old)
+            conn.execute('''
+                INSERT OR REPLACE INTO classifications (url, level1, level2, version, summary_date, classified_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (url, level1, level2, version, summary_dates.get(url), current_datetime))
+            conn.execute('''
+                INSERT INTO category_counts (level1, level2, count) VALUES (?, ?, 1)
+                ON CONFLICT (level1, level2) DO UPDATE SET count = count + 1
+            ''', (level1, level2))
+        conn.execute('DELETE FROM category_counts WHERE count <= 0')
+
+def fetch_category_counts(conn):
     cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR REPLACE INTO classifications (url, level1, level2)
-        VALUES (?, ?, ?)
-    """, (url, level1, level2))
-    conn.commit()
+    cursor.execute('SELECT level1, level2, count FROM category_counts ORDER BY count DESC, level1, level2')
+    return {(level1, level2): count for level1, level2, count in cursor.fetchall()}
+
+def insert_classification(conn, url, level1, level2, summary_date):
+    # summary_date: created_date of the classified summary, so fetch_unclassified_summaries skips it until it changes
+    save_classifications(conn, {url: (level1, level2)}, {url: summary_date})
@@ -0,0 +1,237 @@
+# HTML extraction for the arXiv listing and DOAJ search pages
+#
+# Three interchangeable backends produce identical records:
+#   'selectolax'  lexbor CSS engine (pip install selectolax), fastest
+#   'lxml'        libxml2 with precompiled XPath (pip install lxml)
+#   'bs4'         BeautifulSoup's html.parser, the original reference code
+# html_backend = 'auto' in configs.py picks the first one installed.
+#
+# Works on saved pages as well, to re-extract without a browser:
+#   python html_parsing.py paper_classification/test.html --kind doaj [--backend lxml] [-o articles.json]
+
+import argparse
+import json
+import re
+from   datetime import datetime
+from   configs import *
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+BACKENDS = ['selectolax', 'lxml', 'bs4']
+
+DATE_RE = re.compile(r'\w{3}, (\d{1,2} \w{3} \d{4})')
+
+
+def available_backends():
+    installed = {'selectolax': LexborHTMLParser is not None, 'lxml': lxml_html is not None, 'bs4': True}
+    return [name for name in BACKENDS if installed[name]]
+
+
+def get_backend(name=None):
+    name = name or html_backend
+    if name == 'auto':
+        return available_backends()[0]
+    if name not in available_backends():
+        raise ValueError(f"HTML backend {name} is not available, installed: {available_backends()}")
+    return name
+
+
+def _listing_date(text):
+    match = DATE_RE.search(text)
+    return datetime.strptime(match.group(1), '%d %b %Y').date() if match else None
+
+
+# BeautifulSoup (reference)
+def _doaj_bs4(html_content):
+    from bs4 import BeautifulSoup
+    # Parse the HTML
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Find all the articles in <li> tags with the specific class
+    articles = soup.find_all('li', class_='card search-results__record')
+
+    results = []
+
+    # Loop through each article and extract title, keywords, and abstract
+    for article in articles:
+        # Extract the title from the <h3> tag
+        title = ""
+        title_header = article.find('h3', class_='search-results__heading')
+        if title_header:
+            title_link = title_header.find('a')
+            if title_link:
+                title = title_link.get_text(strip=True)
+
+        # Find "Article keywords" under this <li> element
+        article_keywords_header = article.find('h4', string="Article keywords")
+        keywords = []
+        if article_keywords_header:
+            keyword_list = article_keywords_header.find_next('ul', class_='inlined-list')
+            if keyword_list:
+                keywords = [li.get_text(strip=True) for li in keyword_list.find_all('li')]
+
+        # Find the abstract under this <li> element
+        abstract_text = ""
+        abstract_paragraph = article.find('p', class_='collapse doaj-public-search-abstracttext doaj-public-search-abstracttext-results')
+        if abstract_paragraph:
+            abstract_text = abstract_paragraph.get_text(strip=True)
+
+        # Append the results for this article
+        results.append({
+            "title": title,
+            "keywords": keywords,
+            "abstract": abstract_text
+        })
+    return results
+
+
+def _arxiv_bs4(html_content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    listing_date = None
+    links = []
+    for tag in soup.find_all(['h3', 'a']):
+        if tag.name == 'h3':
+            listing_date = _listing_date(tag.get_text()) or listing_date
+        elif tag.get('title') == 'Abstract' and tag.get('id'):
+            links.append((f'https://arxiv.org/pdf/{tag.get("id")}', listing_date))
+    return links
+
+
+# selectolax (lexbor): CSS selectors, text nodes stripped and joined like bs4's get_text(strip=True)
+def _doaj_selectolax(html_content):
+    results = []
+    for article in LexborHTMLParser(html_content).css('li.card.search-results__record'):
+        title = ""
+        title_link = article.css_first('h3.search-results__heading a')
+        if title_link is not None:
+            title = title_link.text(deep=True, separator='', strip=True)
+
+        # the keyword list is the first ul.inlined-list after the "Article keywords" header
+        keywords = []
+        seen_header = False
+        for node in article.css('h4, ul.inlined-list'):
+            if node.tag == 'h4':
+                seen_header = seen_header or node.text(deep=True) == "Article keywords"
+            elif seen_header:
+                keywords = [li.text(deep=True, separator='', strip=True) for li in node.css('li')]
+                break
+
+        abstract_text = ""
+        abstract_paragraph = article.css_first(
+            'p.collapse.doaj-public-search-abstracttext.doaj-public-search-abstracttext-results')
+        if abstract_paragraph is not None:
+            abstract_text = abstract_paragraph.text(deep=True, separator='', strip=True)
+
+        results.append({"title": title, "keywords": keywords, "abstract": abstract_text})
+    return results
+
+
+def _arxiv_selectolax(html_content):
+    listing_date = None
+    links = []
+    for node in LexborHTMLParser(html_content).css('h3, a[title="Abstract"][id]'):
+        if node.tag == 'h3':
+            listing_date = _listing_date(node.text(deep=True)) or listing_date
+        else:
+            links.append((f'https://arxiv.org/pdf/{node.attributes["id"]}', listing_date))
+    return links
+
+
+# lxml: precompiled XPath
+if lxml_html is not None:
+    def _has_class(name):
+        return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+    _DOAJ_RECORDS = etree.XPath(f"//li[{_has_class('card')} and {_has_class('search-results__record')}]")
+    _DOAJ_TITLE = etree.XPath(f".//h3[{_has_class('search-results__heading')}]//a")
+    _DOAJ_KEYWORDS_HEADER = etree.XPath(".//h4[count(node()) = 1 and text() = 'Article keywords']")
+    _DOAJ_KEYWORD_LIST = etree.XPath(f"following::ul[{_has_class('inlined-list')}][1]")
+    _DOAJ_ABSTRACT = etree.XPath(f".//p[{_has_class('collapse')} and {_has_class('doaj-public-search-abstracttext')}"
+                                 f" and {_has_class('doaj-public-search-abstracttext-results')}]")
+    _ARXIV_TAGS = etree.XPath("//h3 | //a[@title = 'Abstract' and @id]")
+    _TEXT = etree.XPath('.//text()')
+    _LI = etree.XPath('.//li')
+
+
+def _lxml_text(element):
+    return ''.join(text.strip() for text in _TEXT(element))
+
+
+def _doaj_lxml(html_content):
+    results = []
+    for article in _DOAJ_RECORDS(lxml_html.document_fromstring(html_content)):
+        titles = _DOAJ_TITLE(article)
+        title = _lxml_text(titles[0]) if titles else ""
+
+        keywords = []
+        headers = _DOAJ_KEYWORDS_HEADER(article)
+        if headers:
+            keyword_lists = _DOAJ_KEYWORD_LIST(headers[0])
+            if keyword_lists:
+                keywords = [_lxml_text(li) for li in _LI(keyword_lists[0])]
+
+        abstracts = _DOAJ_ABSTRACT(article)
+        abstract_text = _lxml_text(abstracts[0]) if abstracts else ""
+
+        results.append({"title": title, "keywords": keywords, "abstract": abstract_text})
+    return results
+
+
+def _arxiv_lxml(html_content):
+    listing_date = None
+    links = []
+    for element in _ARXIV_TAGS(lxml_html.document_fromstring(html_content)):
+        if element.tag == 'h3':
+            listing_date = _listing_date(''.join(_TEXT(element))) or listing_date
+        else:
+            links.append((f'https://arxiv.org/pdf/{element.get("id")}', listing_date))
+    return links
+
+
+_PARSERS = {
+    'doaj': {'bs4': _doaj_bs4, 'selectolax': _doaj_selectolax, 'lxml': _doaj_lxml},
+    'arxiv': {'bs4': _arxiv_bs4, 'selectolax': _arxiv_selectolax, 'lxml': _arxiv_lxml},
+}
+
+
+def parse_doaj_records(html_content, backend=None):
+    # [{'title', 'keywords', 'abstract'}] for every rendered DOAJ search result
+    return _PARSERS['doaj'][get_backend(backend)](html_content)
+
+
+def parse_arxiv_listing(html_content, backend=None):
+    # [(pdf_link, listing_date)] in page order; listing_date is None on pages without day headers
+    return _PARSERS['arxiv'][get_backend(backend)](html_content)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract records from a saved DOAJ or arXiv listing page")
+    parser.add_argument('path')
+    parser.add_argument('--kind', choices=['doaj', 'arxiv'], default='doaj')
+    parser.add_argument('--backend', choices=['auto'] + BACKENDS, default=None)
+    parser.add_argument('-o', '--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    with open(args.path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    if args.kind == 'doaj':
+        records = parse_doaj_records(html_content, args.backend)
+    else:
+        records = [{'url': url, 'date': str(date) if date else None}
+                   for url, date in parse_arxiv_listing(html_content, args.backend)]
+    output = json.dumps(records, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"{len(records)} records written to {args.output}")
+    else:
+        print(output)
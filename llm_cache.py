@@ -0,0 +1,111 @@
+# Persistent cache of LLM responses (used by llm_gateway.py)
+#
+# Responses are keyed by a hash of the endpoint, model, full message list or
+# prompt and all generation options, so any change to a prompt or to num_ctx,
+# num_predict, temperature, ... is a different entry. Entries expire after a
+# TTL and the least recently used ones are evicted above a size cap. Calls that
+# sample (temperature > 0, Ollama's default is 0.8, which the summary and
+# classification calls use) are cached while llm_cache_sampled is on, the
+# default; turn it off to get fresh samples on reruns. Answers the caller could
+# not parse are never stored (LLMGateway's valid= callback), and retries skip
+# the cached answer (fresh=True).
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from   configs import *
+
+# Ollama's default temperature when the options do not set one
+DEFAULT_TEMPERATURE = 0.8
+
+
+def cache_key(method, kwargs):
+    payload = json.dumps({'method': method, **kwargs}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, db_name=llm_cache_db, ttl=llm_cache_ttl, max_bytes=llm_cache_max_mb * 1024 * 1024,
+                 cache_sampled=llm_cache_sampled):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, timeout=30, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        if self.ttl:
+            self._conn.execute('DELETE FROM responses WHERE created < ?', (time.time() - self.ttl,))
+        self._conn.commit()
+
+    def cacheable(self, kwargs):
+        if kwargs.get('stream'):
+            return False
+        temperature = (kwargs.get('options') or {}).get('temperature', DEFAULT_TEMPERATURE)
+        return self.cache_sampled or temperature == 0
+
+    def get(self, method, kwargs):
+        # returns the cached response dict, or None
+        if not self.cacheable(kwargs):
+            self.bypassed += 1
+            return None
+        key = cache_key(method, kwargs)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl and row[1] < now - self.ttl):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, method, kwargs, response):
+        if not self.cacheable(kwargs):
+            return
+        data = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (cache_key(method, kwargs), kwargs.get('model'), data, len(data), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
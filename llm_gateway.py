@@ -0,0 +1,209 @@
+# Shared gateway to the Ollama server
+#
+# Every LLM call in the repo goes through one LLMGateway per host. It owns a
+# single ollama.AsyncClient (one pooled httpx connection set) running on a
+# background event loop, limits the number of requests in flight, applies a
+# per-call timeout and retries transient failures with exponential backoff.
+#
+# Responses are looked up in the shared LLMCache (llm_cache.py) before a
+# request takes a slot, so reruns with identical prompts never reach the server.
+#
+# chat_until/generate_until stream the answer and hang up as soon as a caller
+# supplied stop condition holds (e.g. the first line is complete), so the server
+# stops generating tokens we would throw away. stats['tokens_budget_unused'] adds
+# up the num_predict left when a stream was cut: an upper bound on the tokens
+# saved, since the model may have reached its end of text sooner anyway.
+#
+# The sync methods mirror ollama.Client (chat/generate with the same keyword
+# arguments), so call sites only swap Client(host=...) for get_gateway(...).
+# The async methods can be awaited from any event loop; they are forwarded to
+# the gateway loop, so sync and async callers share the same pool and limit.
+#
+# Ollama only serves requests concurrently when the server runs with
+# OLLAMA_NUM_PARALLEL >= llm_max_in_flight.
+
+import asyncio
+import random
+import threading
+import httpx
+from   ollama import AsyncClient, ResponseError
+from   ollama._types import ChatResponse, GenerateResponse
+from   llm_cache import LLMCache
+from   configs import *
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+_shared_cache = None
+
+_RESPONSE_TYPES = {'chat': ChatResponse, 'generate': GenerateResponse}
+
+
+def get_gateway(host=api_url):
+    global _shared_cache
+    with _gateways_lock:
+        if host not in _gateways:
+            if llm_cache_enabled and _shared_cache is None:
+                _shared_cache = LLMCache()
+            _gateways[host] = LLMGateway(host, cache=_shared_cache)
+        return _gateways[host]
+
+
+def _text(method, response, stop):
+    # answer text of a response, as valid() callbacks see it
+    if stop is not None:
+        return response
+    return response['message']['content'] if method == 'chat' else response['response']
+
+
+def _is_transient(error):
+    if isinstance(error, ResponseError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError, asyncio.TimeoutError))
+
+
+class LLMGateway:
+    def __init__(self, host=api_url, max_in_flight=llm_max_in_flight, timeout=llm_timeout,
+                 retries=llm_retries, backoff=llm_backoff, cache=None):
+        self.host = host
+        self.cache = cache
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'tokens_budget_unused': 0}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f'llm-gateway-{host}', daemon=True)
+        self._thread.start()
+        # the client and the semaphore must be created on the loop that uses them
+        self._client, self._slots = self._run(self._setup())
+
+    async def _setup(self):
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        return AsyncClient(host=self.host, limits=limits, timeout=None), asyncio.Semaphore(self.max_in_flight)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _consume(self, method, stop, kwargs):
+        # returns (text, tokens received, stopped early); closing the stream drops the
+        # connection, which makes Ollama abort the generation
+        stream = await getattr(self._client, method)(stream=True, **kwargs)
+        text, tokens = '', 0
+        try:
+            async for chunk in stream:
+                piece = chunk['message']['content'] if method == 'chat' else chunk['response']
+                if piece:
+                    tokens += 1
+                    text += piece
+                if stop(text):
+                    return text, tokens, not chunk.get('done')
+            return text, tokens, False
+        finally:
+            await stream.aclose()
+
+    async def _request(self, method, stop, kwargs):
+        if stop is None:
+            response = await getattr(self._client, method)(**kwargs)
+            return response, response.model_dump(mode='json')
+
+        text, tokens, stopped = await self._consume(method, stop, kwargs)
+        num_predict = (kwargs.get('options') or {}).get('num_predict') or 0
+        if stopped and num_predict > tokens:
+            self.stats['tokens_budget_unused'] += num_predict - tokens
+        return text, {'content': text}
+
+    async def _call(self, method, timeout, kwargs, stop=None, fresh=False, valid=None):
+        # streamed calls are cached under their own key, including the stop condition.
+        # fresh=True skips the cached answer (a caller retrying after an unusable one), and
+        # answers for which valid(text) is false are not stored
+        cache_method = method if stop is None else f'{method}_until'
+        cache_kwargs = kwargs if stop is None else dict(kwargs, stop=getattr(stop, '__name__', repr(stop)))
+        if self.cache is not None and not fresh:
+            cached = self.cache.get(cache_method, cache_kwargs)
+            if cached is not None:
+                return _RESPONSE_TYPES[method](**cached) if stop is None else cached['content']
+
+        # waiting for a slot is the request queue; the timeout only covers the request itself
+        timeout = self.timeout if timeout is None else timeout
+        for attempt in range(self.retries + 1):
+            async with self._slots:
+                self.stats['requests'] += 1
+                try:
+                    response, payload = await asyncio.wait_for(self._request(method, stop, kwargs), timeout)
+                    if self.cache is not None and (valid is None or valid(_text(method, response, stop))):
+                        self.cache.put(cache_method, cache_kwargs, payload)
+                    return response
+                except Exception as e:
+                    if attempt == self.retries or not _is_transient(e):
+                        self.stats['failures'] += 1
+                        raise
+                    error = e
+            self.stats['retries'] += 1
+            delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+            print(f"LLM request failed ({error}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+    async def _forward(self, method, timeout, kwargs, stop=None, fresh=False, valid=None):
+        coro = self._call(method, timeout, kwargs, stop, fresh, valid)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self._loop))
+
+    # async API
+    async def achat(self, model, messages, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return await self._forward('chat', timeout,
+                                   dict(model=model, messages=messages, options=options, **kwargs), None, fresh, valid)
+
+    async def agenerate(self, model, prompt, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return await self._forward('generate', timeout,
+                                   dict(model=model, prompt=prompt, options=options, **kwargs), None, fresh, valid)
+
+    async def achat_until(self, model, messages, stop, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return await self._forward('chat', timeout,
+                                   dict(model=model, messages=messages, options=options, **kwargs), stop, fresh, valid)
+
+    async def agenerate_until(self, model, prompt, stop, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return await self._forward('generate', timeout,
+                                   dict(model=model, prompt=prompt, options=options, **kwargs), stop, fresh, valid)
+
+    # sync API, drop-in for ollama.Client
+    def chat(self, model, messages, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return self._run(self._call('chat', timeout,
+                                    dict(model=model, messages=messages, options=options, **kwargs), None, fresh, valid))
+
+    def generate(self, model, prompt, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return self._run(self._call('generate', timeout,
+                                    dict(model=model, prompt=prompt, options=options, **kwargs), None, fresh, valid))
+
+    def chat_until(self, model, messages, stop, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        # stream the answer until stop(text_so_far) is true; returns the text received
+        return self._run(self._call('chat', timeout,
+                                    dict(model=model, messages=messages, options=options, **kwargs), stop, fresh, valid))
+
+    def generate_until(self, model, prompt, stop, options=None, timeout=None, fresh=False, valid=None, **kwargs):
+        return self._run(self._call('generate', timeout,
+                                    dict(model=model, prompt=prompt, options=options, **kwargs), stop, fresh, valid))
+
+    def chat_many(self, calls):
+        # run a list of chat() keyword dicts concurrently (up to max_in_flight); results keep the input order
+        async def gather():
+            return await asyncio.gather(*(self._call('chat', call.pop('timeout', None), call, None, call.pop('fresh', False),
+                                                     call.pop('valid', None)) for call in map(dict, calls)))
+        return self._run(gather())
+
+
+# Stop conditions for chat_until/generate_until
+def stop_after_first_line(text):
+    # a non-empty line has been completed
+    stripped = text.lstrip()
+    return '\n' in stripped and bool(stripped.split('\n', 1)[0].strip())
+
+def stop_after_closed_list(text):
+    # a [...] list has been opened and closed
+    start = text.find('[')
+    return start >= 0 and text.find(']', start) > start
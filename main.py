@@ -4,68 +4,97 @@
 # docker start ollama
 
 import json
-from arxiv2text import arxiv_to_text
 from funcs import *
 from configs import *
+from pipeline import run_pipeline
+from text_cache import TextCache, cached_arxiv_text
+from embedding_classifier import EmbeddingClassifier, classify_summaries_embedding, embeddings_available
 
-# DB
-conn = init_db(summary_db)
-# delete_table(conn)
+if __name__ == "__main__":
+    # DB
+    conn = init_db(summary_db)
+    # delete_table(conn)
 
-# Define test data set
-test_urls = get_arxiv_pdf_links(article_main_url)
-for url in test_urls:
-    print(f"Processing URL: {url}")
-
-    # check if summary exist in DB
-    summary = get_summary_from_db(conn, url,['summary'])
-    if summary:
-        print("Summary found in database!")
+    # Define test data set
+    if backfill_since:
+        since = datetime.strptime(backfill_since, '%Y-%m-%d').date()
+        test_urls = list(backfill_arxiv_pdf_links(article_category, since, conn=conn))
+    else:
+        test_urls = list(iter_arxiv_pdf_links(article_main_url, conn=conn))
+    versions, manifest = {}, None
+    if incremental_mode:
+        test_urls, versions, manifest = select_changed_urls(conn, test_urls)
 
-    arxiv_text = arxiv_to_text(url)
-    payload_text = extract_abstract_section(arxiv_text)
-    
-    if payload_text:
-        print("########### Abstract ##############")
-        print(payload_text)
-        user_message = {
-            'role': 'user',
-                'content': f"""Extract the key takeaways from the following research summary in exactly 50 words or less. 
-                            Provide only the summary text without any additional explanation:\n\n{payload_text}"""
-        }
-        messages = [system_message, user_message]
-        summary = bot_response(messages, api_url)
-        print("########### Summary ##############")
-        print(summary)
-        save_summary_to_db(conn, url, payload_text, summary)
+    cache = TextCache()
+    if pipeline_mode:
+        run_pipeline(test_urls, summary_db, api_url, versions=versions, manifest=manifest, cache=cache)
     else:
-        print("Payload text invalid...")
+        for url in test_urls:
+            print(f"Processing URL: {url}")
+
+            # check if summary exist in DB
+            summary = get_summary_from_db(conn, url,['summary'])
+            if summary:
+                print("Summary found in database!")
 
+            arxiv_text, hash_ = cached_arxiv_text(url, cache, versions.get(url))
+            if manifest is not None and is_unchanged(manifest.get(url), hash_=hash_):
+                print("PDF unchanged, skipping...")
+                continue
+            payload_text = extract_abstract_section(arxiv_text)
 
-# summary classification
-conn = sqlite3.connect(summary_db)
-summaries = fetch_all_summaries(conn, ['url','summary'])
-print(len(summaries))
-# classified_counts = classify_summaries(api_url, summaries[:10])
-# print(classified_counts)
-category_counts, url_classifications = classify_summaries_with_two_layers(api_url, summaries)
+            if payload_text:
+                print("########### Abstract ##############")
+                print(payload_text)
+                messages = build_summary_messages(payload_text)
+                summary = bot_response(messages, api_url)
+                print("########### Summary ##############")
+                print(summary)
+                save_summary_to_db(conn, url, payload_text, summary)
+            else:
+                print("Payload text invalid...")
+            update_manifest(conn, url, versions.get(url), hash_)
+        print(f"Text cache: {cache.stats()}")
 
-# 打印分类统计结果
-print("classification and statistics results:")
-for (level1, level2), count in category_counts.items():
-    print(f"{level1}: {level2} - {count}")
 
-# 打印每个 URL 的分类结果
-print("\n2-layers classification for each url:")
-print(len(url_classifications.items()))
-for url, (level1, level2) in url_classifications.items():
-    print(f"{url} -> {level1}: {level2}")
+    # summary classification
+    conn = sqlite3.connect(summary_db)
+    # classification DB
+    classification_conn = init_classification_db()
+    if incremental_classification:
+        summaries = fetch_unclassified_summaries(conn)
+    else:
+        summaries = fetch_all_summaries(conn, ['url','summary'])
+    summary_dates = dict(fetch_all_summaries(conn, ['url','created_date']))
+    print(len(summaries))
+    # classified_counts = classify_summaries(api_url, summaries[:10])
+    # print(classified_counts)
+    if not summaries:
+        url_classifications = {}
+    elif classify_embedding and embeddings_available():
+        classifier = EmbeddingClassifier(classification_conn)
+        classifier.bootstrap(conn)
+        _, url_classifications = classify_summaries_embedding(api_url, summaries, classifier)
+    elif classify_batched:
+        _, url_classifications = classify_summaries_batched(api_url, summaries)
+    else:
+        _, url_classifications = classify_summaries_with_two_layers(api_url, summaries)
+
+    # 插入分类结果 (labels and category counts are updated together)
+    save_classifications(classification_conn, url_classifications, summary_dates)
+    print('Inserted classfication output into DB...')
 
-# classification DB
-classification_conn = init_classification_db()
+    # 打印每个 URL 的分类结果
+    print("\n2-layers classification for each url:")
+    print(len(url_classifications.items()))
+    for url, (level1, level2) in url_classifications.items():
+        print(f"{url} -> {level1}: {level2}")
 
-# 插入分类结果
-for url, (level1, level2) in url_classifications.items():
-    insert_classification(classification_conn, url, level1, level2)
-print('Inserted classfication output into DB...')
+    # 打印分类统计结果 (whole corpus, from the category_counts table)
+    print("classification and statistics results:")
+    for (level1, level2), count in fetch_category_counts(classification_conn).items():
+        print(f"{level1}: {level2} - {count}")
 
+    if get_gateway(api_url).cache is not None:
+        print(f"LLM cache: {get_gateway(api_url).cache.stats()}")
+    print(f"LLM gateway: {get_gateway(api_url).stats}")
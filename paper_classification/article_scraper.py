@@ -1,73 +1,182 @@
 # Import required modules
+import os
+import sys
 import requests
-from   bs4 import BeautifulSoup
 import json
-from   playwright.sync_api import sync_playwright
-from   ollama import Client
 import hashlib
+import re
+import time
+import asyncio
+import threading
+from   urllib.parse import urlparse, parse_qs, urlencode, urlunparse
+from   tqdm import tqdm
+from   concurrent.futures import ThreadPoolExecutor
+
+# Shared modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from   llm_gateway import get_gateway, stop_after_first_line, stop_after_closed_list
+from   configs import llm_max_in_flight, keyword_mode, keyword_batch_ctx
+from   configs import cluster_shard_ctx, cluster_merge_threshold, cluster_confirm_merges
+from   configs import scraper_max_pages, scraper_timeout, scraper_retries, article_store_path
+from   prompt_budget import choose_num_ctx, count_tokens, fits, message_tokens
+from   html_parsing import parse_doaj_records
+from   article_store import ArticleStore
 
 # Define Ollama API endpoint
 API_URL = 'http://localhost:11434'
 
+# Rendered search results, DOAJ builds them in the browser
+DOAJ_RESULT_SELECTOR = 'li.card.search-results__record'
+# Requests a scraping page never needs
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'media', 'stylesheet'}
+BLOCKED_HOSTS = ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'hotjar.com', 'plausible.io')
+
+def parse_doaj_results(html_content):
+    # [{'title', 'keywords', 'abstract'}], parsed with the html_backend from configs.py
+    return parse_doaj_records(html_content)
+
+def doaj_page_url(url, start, size):
+    # DOAJ keeps the search as JSON in the `source` query parameter; set its from/size
+    parts = urlparse(url)
+    query = parse_qs(parts.query)
+    source = json.loads(query.get('source', ['{}'])[0])
+    source['from'] = start
+    source['size'] = str(size)
+    query['source'] = [json.dumps(source, separators=(',', ':'))]
+    return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+class ScraperSession:
+    # One headless Chromium shared by all fetches. Every page gets its own context, up to
+    # max_pages at once; a page is read as soon as the results are rendered (or the network
+    # goes idle, for pages without results) instead of after a fixed sleep. Images, fonts,
+    # styles and analytics are never downloaded.
+    # Playwright's async API runs on a private event loop thread (as in llm_gateway.py),
+    # so the methods below are plain blocking calls.
+    def __init__(self, max_pages=scraper_max_pages, timeout=scraper_timeout, retries=scraper_retries, headless=True,
+                 debug=False):
+        self.max_pages = max_pages
+        self.timeout = timeout * 1000  # Playwright takes milliseconds
+        self.retries = retries
+        self.headless = headless
+        self.debug = debug
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='scraper-session', daemon=True)
+        self._thread.start()
+        self._playwright, self._browser, self._slots = self._run(self._start())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def _start(self):
+        # imported here, so the LLM helpers below can be used without a browser installed
+        from playwright.async_api import async_playwright
+        playwright = await async_playwright().start()
+        browser = await playwright.chromium.launch(headless=self.headless)
+        return playwright, browser, asyncio.Semaphore(self.max_pages)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    @staticmethod
+    async def _route(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ''
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _fetch(self, url, selector):
+        # rendered HTML, or None when the page failed to load retries + 1 times
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(2 ** attempt)  # the slot is free while waiting
+            html_content = await self._fetch_once(url, selector)
+            if html_content is not None:
+                return html_content
+        return None
+
+    async def _fetch_once(self, url, selector):
+        async with self._slots:
+            start = time.perf_counter()
+            context = await self._browser.new_context()
+            try:
+                await context.route('**/*', self._route)
+                page = await context.new_page()
+                try:
+                    await page.goto(url, wait_until='domcontentloaded', timeout=self.timeout)
+                except Exception as e:
+                    print(f"Failed to load {url}: {e}")
+                    return None
+                # whichever comes first: the results are rendered, or nothing is loading anymore
+                waits = [asyncio.ensure_future(page.wait_for_selector(selector, timeout=self.timeout)),
+                         asyncio.ensure_future(page.wait_for_load_state('networkidle', timeout=self.timeout))]
+                done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                for wait in pending:
+                    wait.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                # neither happened in time: the page is not known to be complete, try again
+                if all(wait.exception() for wait in done):
+                    print(f"Timed out waiting for {url}: {next(iter(done)).exception()}")
+                    return None
+                html_content = await page.content()
+            finally:
+                await context.close()
+            if self.debug:
+                print(f"DEBUG: Fetched {url} in {time.perf_counter() - start:.1f}s")
+            return html_content
+
+    async def _fetch_many(self, urls, selector):
+        return await asyncio.gather(*(self._fetch(url, selector) for url in urls))
+
+    def fetch(self, url, selector=DOAJ_RESULT_SELECTOR):
+        # None when the page could not be loaded
+        return self._run(self._fetch(url, selector))
+
+    def fetch_many(self, urls, selector=DOAJ_RESULT_SELECTOR):
+        # rendered HTML of every url, in order (None for pages that could not be loaded);
+        # up to max_pages are loaded at the same time
+        return self._run(self._fetch_many(urls, selector))
+
+    def iter_articles(self, url, size=200, max_results=None):
+        # Yield DOAJ articles page by page (from/size), fetching max_pages pages at a time,
+        # until a page comes back short or max_results articles were yielded. A page that
+        # cannot be loaded raises, so a failed crawl is never taken for a complete one.
+        start, count = 0, 0
+        while True:
+            urls = [doaj_page_url(url, start + i * size, size) for i in range(self.max_pages)]
+            for page_url, html_content in zip(urls, self.fetch_many(urls)):
+                if html_content is None:
+                    raise RuntimeError(f"Could not load {page_url} after {self.retries + 1} attempts, "
+                                       f"stopping after {count} articles")
+                articles = parse_doaj_results(html_content)
+                for article in articles:
+                    yield article
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+                if len(articles) < size:
+                    return
+            start += self.max_pages * size
+
+    def close(self):
+        if self._browser is not None:
+            self._run(self._browser.close())
+            self._run(self._playwright.stop())
+            self._browser = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
 def fetch_dynamic_content(url):
-    with sync_playwright() as p:
-        # Launch the browser
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        # Open the webpage
-        page.goto(url)
-        
-        # Wait for the page to load
-        page.wait_for_timeout(5000)  # Adjust wait time as needed to ensure the page is fully loaded
-        
-        # Get the page HTML content
-        html_content = page.content()
-        
-        # Parse the HTML
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Find all the articles in <li> tags with the specific class
-        articles = soup.find_all('li', class_='card search-results__record')
-
-        results = []
-        
-        # Loop through each article and extract title, keywords, and abstract
-        for article in articles:
-            # Extract the title from the <h3> tag
-            title = ""
-            title_header = article.find('h3', class_='search-results__heading')
-            if title_header:
-                title_link = title_header.find('a')
-                if title_link:
-                    title = title_link.get_text(strip=True)
-
-            # Find "Article keywords" under this <li> element
-            article_keywords_header = article.find('h4', string="Article keywords")
-            keywords = []
-            if article_keywords_header:
-                keyword_list = article_keywords_header.find_next('ul', class_='inlined-list')
-                if keyword_list:
-                    keywords = [li.get_text(strip=True) for li in keyword_list.find_all('li')]
-            
-            # Find the abstract under this <li> element
-            abstract_text = ""
-            abstract_paragraph = article.find('p', class_='collapse doaj-public-search-abstracttext doaj-public-search-abstracttext-results')
-            if abstract_paragraph:
-                abstract_text = abstract_paragraph.get_text(strip=True)
-            
-            # Append the results for this article
-            results.append({
-                "title": title,
-                "keywords": keywords,
-                "abstract": abstract_text
-            })
-        
-        # Close the browser
-        browser.close()
-        
-        # Return JSON output
-        return json.dumps(results, indent=2)
+    # single page, JSON string of its articles
+    with ScraperSession() as scraper:
+        html_content = scraper.fetch(url)
+    if html_content is None:
+        raise RuntimeError(f"Could not load {url}")
+    # Return JSON output
+    return json.dumps(parse_doaj_results(html_content), indent=2)
 
 def llm_keywords(article_title, article_abstract, api_url=API_URL, debug=False):
     prompt = f"""
@@ -89,19 +198,179 @@ Abstract: {article_abstract}
         'content': prompt
     }
     messages = [user_message]
-    client = Client(host=api_url)
+    client = get_gateway(api_url)
     options = {
-        'num_ctx': 8192,       # Adjusted based on model capacity
+        'num_ctx': choose_num_ctx(message_tokens(messages), 512, 8192),  # smallest context that fits, up to 8192
         'num_predict': 512,    # Sufficient for classification outputs
         'repeat_penalty': 1.2, # Keeps repetition in check
         'temperature': 0.5,    # Low randomness for consistency
         'top_k': 50,           # Considers top 50 tokens for generation
         'top_p': 0.9,          # Cumulative probability of 90%
     }
-    response = client.chat(model='llama3.2', messages=messages, options=options)
-    llm_output = response['message']['content'].strip()
+    # the list is all we use, stop streaming once it is closed
+    llm_output = client.chat_until(model='llama3.2', messages=messages, stop=stop_after_closed_list, options=options).strip()
     return llm_output
 
+KEYWORDS_BATCH_PROMPT = """
+You are a highly skilled text classification assistant.
+I will provide you with several scientific articles separated by three dashes (---). Each one starts with its ID on its own line, followed by its title and abstract.
+Your task is to analyze each article's title and abstract and extract the most appropriate Top {k} keywords from it.
+Instructions:
+1. Respond with exactly one line per article in the format: ID|[Keyword, Keyword, ...]
+2. Do not output anything else.
+Example Output:
+1a2b3c4d|[Blockchain, Differential Privacy, IoT, Decentralization, Cryptography]
+5e6f7a8b|[Deep Learning, Transformers, Text Classification, Attention, Transfer Learning]
+Here are the articles:
+{articles}
+"""
+
+# Output tokens reserved per article in a batch ("1a2b3c4d|[five keywords]")
+KEYWORD_TOKENS_PER_ITEM = 48
+
+KEYWORD_LINE_RE = re.compile(r'^\W*(?:ID:?\s*)?([0-9a-f]{8})\s*\|\s*(.+)$')
+
+def parse_keyword_list(text):
+    # "[A, B, 'C']" (or a bare comma separated first line) -> ['A', 'B', 'C']
+    match = re.search(r'\[(.*?)\]', text, re.DOTALL)
+    body = match.group(1) if match else text.strip().split('\n', 1)[0]
+    keywords = [keyword.strip().strip('"\'').strip() for keyword in body.split(',')]
+    return [keyword for keyword in keywords if keyword]
+
+def pack_keyword_batches(items, max_tokens, max_items=None, k=5):
+    # greedily fill batches of (id, title, abstract) while prompt + reserved output fit in max_tokens
+    overhead = message_tokens([{'content': KEYWORDS_BATCH_PROMPT.format(k=k, articles='')}])
+    batches, batch, used = [], [], overhead
+    for item in items:
+        cost = count_tokens(item[1]) + count_tokens(item[2]) + 16
+        full = max_items and len(batch) >= max_items
+        if batch and (full or not fits(used + cost, KEYWORD_TOKENS_PER_ITEM * (len(batch) + 1), max_tokens)):
+            batches.append(batch)
+            batch, used = [], overhead
+        batch.append(item)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+def llm_keywords_batch(articles, api_url=API_URL, max_tokens=keyword_batch_ctx, k=5, debug=False):
+    # Keywords for many articles per request; returns one list per article, in order.
+    # Articles whose line is missing are re-queued in batches half the size, then
+    # asked one at a time with llm_keywords.
+    items = [(hashlib.md5(f'{index}{article["title"]}'.encode()).hexdigest()[:8], article['title'], article['abstract'])
+             for index, article in enumerate(articles)]
+    results = {}
+    pending = items
+    max_items = None
+    client = get_gateway(api_url)
+
+    while pending and max_items != 1:
+        batches = pack_keyword_batches(pending, max_tokens, max_items, k)
+        calls = []
+        for batch in batches:
+            text = '\n---\n'.join(f'{id_}\nTitle: {title}\nAbstract: {abstract}' for id_, title, abstract in batch)
+            messages = [{'role': 'user', 'content': KEYWORDS_BATCH_PROMPT.format(k=k, articles=text)}]
+            batch_predict = KEYWORD_TOKENS_PER_ITEM * len(batch)
+            calls.append(dict(model='llama3.2', messages=messages, options={
+                'num_ctx': choose_num_ctx(message_tokens(messages), batch_predict, max_tokens),
+                'num_predict': batch_predict,
+                'repeat_penalty': 1.2,
+                'temperature': 0.5,
+                'top_k': 50,
+                'top_p': 0.9,
+            }))
+
+        failed = []
+        for batch, response in zip(batches, client.chat_many(calls)):
+            ids = {id_ for id_, _, _ in batch}
+            for line in response['message']['content'].splitlines():
+                match = KEYWORD_LINE_RE.match(line.strip())
+                if match and match.group(1) in ids:
+                    keywords = parse_keyword_list(match.group(2))[:k]
+                    if keywords:
+                        results[match.group(1)] = keywords
+            failed.extend(item for item in batch if item[0] not in results)
+        if debug:
+            print(f"DEBUG: {len(batches)} keyword batches, {len(pending) - len(failed)} done, {len(failed)} re-queued")
+        pending = failed
+        max_items = max(1, max(len(batch) for batch in batches) // 2)
+
+    for id_, title, abstract in pending:
+        results[id_] = parse_keyword_list(llm_keywords(title, abstract, api_url))[:k]
+    return [results[id_] for id_, _, _ in items]
+
+# Words that may not start or end a candidate keyphrase
+STOPWORDS = set("""
+a about above after again against all also an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having here how however i
+if in into is it its itself just may more most much new no nor not novel of off on once only or other our out
+over own paper propose proposed proposes same should so some such than that the their them then there these they
+this those through to too under until up upon using very via was we were what when where which while who whom
+why will with within without would yet
+""".split())
+
+def candidate_phrases(text, max_words=3):
+    # n-grams of up to max_words words that neither start nor end with a stopword
+    candidates = {}
+    for sentence in re.split(r'[.;:!?()\[\]"]|,\s', text):
+        words = re.findall(r"[A-Za-z][A-Za-z0-9\-']*", sentence)
+        for n in range(1, max_words + 1):
+            for i in range(len(words) - n + 1):
+                gram = words[i:i + n]
+                if gram[0].lower() in STOPWORDS or gram[-1].lower() in STOPWORDS or len(gram[-1]) < 3:
+                    continue
+                # keep the first spelling seen of each phrase
+                candidates.setdefault(' '.join(gram).lower(), ' '.join(gram))
+    return list(candidates.values())
+
+def embedding_keywords(articles, k=5, diversity=0.5, debug=False):
+    # CPU-only keywords: candidate phrases from title and abstract ranked by embedding
+    # similarity to the article, with maximal marginal relevance to avoid near-duplicates.
+    # Uses the sentence-transformers model from embeddings.py.
+    import numpy as np
+    from embeddings import load_embedding_model
+    model = load_embedding_model()
+    documents = [f"{article['title']}. {article['abstract']}" for article in articles]
+    candidates = [candidate_phrases(document) for document in documents]
+    doc_vectors = model.encode(documents, batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+    # embed every distinct phrase of the whole set once
+    phrases = sorted({phrase for phrase_list in candidates for phrase in phrase_list})
+    phrase_index = {phrase: i for i, phrase in enumerate(phrases)}
+    phrase_vectors = model.encode(phrases, batch_size=256, normalize_embeddings=True, show_progress_bar=False)
+    if debug:
+        print(f"DEBUG: Embedded {len(documents)} articles and {len(phrases)} candidate phrases")
+
+    results = []
+    for doc_vector, phrase_list in zip(doc_vectors, candidates):
+        if not phrase_list:
+            results.append([])
+            continue
+        vectors = phrase_vectors[[phrase_index[phrase] for phrase in phrase_list]]
+        relevance = vectors @ doc_vector
+        chosen = [int(np.argmax(relevance))]
+        while len(chosen) < min(k, len(phrase_list)):
+            redundancy = (vectors @ vectors[chosen].T).max(axis=1)
+            scores = (1 - diversity) * relevance - diversity * redundancy
+            scores[chosen] = -np.inf
+            chosen.append(int(np.argmax(scores)))
+        results.append([phrase_list[i] for i in chosen])
+    return results
+
+def extract_keywords(articles, mode=keyword_mode, api_url=API_URL, k=5, debug=False):
+    # Top-k keywords for every {'title', 'abstract'} article, as lists, in input order.
+    # mode: 'llm' (one request per article), 'batch' (many articles per request)
+    # or 'embedding' (no LLM, needs sentence-transformers)
+    if mode == 'batch':
+        return llm_keywords_batch(articles, api_url, k=k, debug=debug)
+    if mode == 'embedding':
+        return embedding_keywords(articles, k=k, debug=debug)
+    if mode != 'llm':
+        raise ValueError(f"Unknown keyword mode: {mode}")
+    # Keep the gateway's request slots busy instead of waiting on one article at a time
+    with ThreadPoolExecutor(max_workers=llm_max_in_flight) as executor:
+        results = executor.map(lambda rec: llm_keywords(rec['title'], rec['abstract'], api_url, debug), articles)
+        return [parse_keyword_list(output)[:k] for output in tqdm(results, total=len(articles), desc="Extracting keywords")]
+
 def llm_clustering(article_title, article_keywords, api_url=API_URL, debug=False):
     prompt = f"""
 You are a highly skilled text classification assistant.
@@ -124,21 +393,20 @@ Keywords: {article_keywords}
         'content': prompt
     }
     messages = [user_message]
-    client = Client(host=api_url)
+    client = get_gateway(api_url)
     options = {
-        'num_ctx': 8192,       # Adjusted based on model capacity
+        'num_ctx': choose_num_ctx(message_tokens(messages), 512, 8192),  # smallest context that fits, up to 8192
         'num_predict': 512,    # Sufficient for classification outputs
         'repeat_penalty': 1.2, # Keeps repetition in check
         'temperature': 0.5,    # Low randomness for consistency
         'top_k': 50,           # Considers top 50 tokens for generation
         'top_p': 0.9,          # Cumulative probability of 90%
     }
-    response = client.chat(model='llama3.2', messages=messages, options=options)
-    llm_output = response['message']['content'].strip()
+    # a single category: stop streaming after the first line
+    llm_output = client.chat_until(model='llama3.2', messages=messages, stop=stop_after_first_line, options=options).strip()
     return llm_output
 
-def llm_clustering_batch(articles, api_url=API_URL, debug=False):
-    prompt = f"""
+CLUSTERING_BATCH_PROMPT = """
 You are a highly skilled text classification assistant.
 I will provide you with a list of scientific articles from the Big Data Mining and Analytics Journal, and your task is to analyze each article's title and keywords to automatically extract the single most appropriate category from it.
 Instructions:
@@ -158,6 +426,9 @@ ijkl|Retrieval-Augmented Generation
 Here are the articles:
 {articles}
 """
+
+def llm_clustering_batch(articles, api_url=API_URL, max_ctx=32000, num_predict=2048, debug=False):
+    prompt = CLUSTERING_BATCH_PROMPT.format(articles=articles)
     if debug:
         print(f"DEBUG: Prompt length: {len(prompt)} bytes\n")
     user_message = {
@@ -165,10 +436,13 @@ Here are the articles:
         'content': prompt
     }
     messages = [user_message]
-    client = Client(host=api_url)
+    client = get_gateway(api_url)
+    prompt_tokens = message_tokens(messages)
+    if not fits(prompt_tokens, num_predict, max_ctx):
+        print(f"WARNING: {prompt_tokens} prompt tokens do not fit num_ctx {max_ctx}, the server will truncate the articles.")
     options = {
-        'num_ctx': 32000,       # Adjusted based on model capacity
-        'num_predict': 2048,    # Sufficient for classification outputs
+        'num_ctx': choose_num_ctx(prompt_tokens, num_predict, max_ctx),  # smallest context that fits, up to max_ctx
+        'num_predict': num_predict,    # Sufficient for classification outputs
         'repeat_penalty': 1.2, # Keeps repetition in check
         'temperature': 0.5,    # Low randomness for consistency
         'top_k': 50,           # Considers top 50 tokens for generation
@@ -178,60 +452,185 @@ Here are the articles:
     llm_output = response['message']['content'].strip()
     return llm_output
 
-# Function: Generate Article ID
-def generate_id(input_text):
-    result = hashlib.md5(input_text.encode()).hexdigest()
-    return result
+# Output tokens reserved per article in a clustering shard ("<32 hex id>|Category")
+CLUSTER_TOKENS_PER_ITEM = 32
+
+CLUSTER_LINE_RE = re.compile(r'^\W*(?:Article ID:?\s*)?([0-9a-f]{32})\s*\|\s*(.+)$')
+
+def cluster_record_text(record):
+    return f"Article ID: {record['id']}\nTitle: {record['title']}\nKeywords: {record['keywords']}\n---\n"
+
+def parse_cluster_pairs(output, ids):
+    # {id: category} for every "id|Category" line with a known id
+    pairs = {}
+    for line in output.splitlines():
+        match = CLUSTER_LINE_RE.match(line.strip())
+        if match and match.group(1) in ids:
+            category = match.group(2).strip().strip('"\'*').strip()
+            if category:
+                pairs[match.group(1)] = category
+    return pairs
+
+def shard_records(records, max_ctx):
+    # greedily fill shards while prompt + reserved output fit in max_ctx
+    overhead = message_tokens([{'content': CLUSTERING_BATCH_PROMPT.format(articles='')}])
+    shards, shard, used = [], [], overhead
+    for record in records:
+        cost = count_tokens(cluster_record_text(record))
+        if shard and not fits(used + cost, CLUSTER_TOKENS_PER_ITEM * (len(shard) + 1), max_ctx):
+            shards.append(shard)
+            shard, used = [], overhead
+        shard.append(record)
+        used += cost
+    if shard:
+        shards.append(shard)
+    return shards
+
+def _run_shard(number, shard, api_url, max_ctx, debug):
+    start = time.perf_counter()
+    output = llm_clustering_batch(''.join(cluster_record_text(record) for record in shard), api_url,
+                                  max_ctx=max_ctx, num_predict=CLUSTER_TOKENS_PER_ITEM * len(shard))
+    pairs = parse_cluster_pairs(output, {record['id'] for record in shard})
+    timing = {'shard': number, 'articles': len(shard), 'parsed': len(pairs), 'seconds': time.perf_counter() - start}
+    if debug:
+        print(f"DEBUG: Shard {number}: {len(pairs)}/{len(shard)} articles in {timing['seconds']:.1f}s")
+    return pairs, timing
+
+def normalize_category(name):
+    # "Deep-Learning." / "deep learning" -> "deep learning"
+    name = re.sub(r'[^0-9a-z]+', ' ', name.lower()).strip()
+    return re.sub(r'(?<=[a-z]{3})s$', '', name)
+
+def llm_same_category(a, b, api_url=API_URL):
+    messages = [{'role': 'user', 'content': f"""
+Do the research categories "{a}" and "{b}" mean the same thing, so that articles in one belong in the other?
+Only respond with Yes or No.
+"""}]
+    options = {'num_ctx': choose_num_ctx(message_tokens(messages), 8, 2048), 'num_predict': 8, 'temperature': 0}
+    answer = get_gateway(api_url).chat_until(model='llama3.2', messages=messages, stop=stop_after_first_line, options=options)
+    return answer.strip().lower().startswith('yes')
+
+def merge_categories(categories, threshold=cluster_merge_threshold, confirm=cluster_confirm_merges, api_url=API_URL, debug=False):
+    # Reduce step: map every category name to a canonical one. Names are visited from the
+    # most to the least used; each joins the closest canonical name when the embedding
+    # similarity reaches `threshold` (and the LLM agrees, with confirm=True), otherwise it
+    # becomes canonical itself. Without sentence-transformers only spelling variants merge.
+    counts = {}
+    for category in categories:
+        counts[category] = counts.get(category, 0) + 1
+    names = sorted(counts, key=lambda name: (-counts[name], name))
+
+    canonical, mapping, by_spelling = [], {}, {}
+    for name in names:
+        key = normalize_category(name)
+        if key in by_spelling:
+            mapping[name] = by_spelling[key]
+        else:
+            by_spelling[key] = mapping[name] = name
+            canonical.append(name)
+
+    from embeddings import embeddings_available, load_embedding_model
+    if not embeddings_available():
+        print("sentence-transformers is not installed, merging spelling variants of categories only.")
+        return mapping
+
+    vectors = load_embedding_model().encode(canonical, normalize_embeddings=True, show_progress_bar=False)
+    kept = []   # indices of canonical names that survived
+    for i, name in enumerate(canonical):
+        target = None
+        if kept:
+            similarities = vectors[kept] @ vectors[i]
+            best = int(similarities.argmax())
+            if similarities[best] >= threshold and (not confirm or llm_same_category(canonical[kept[best]], name, api_url)):
+                target = canonical[kept[best]]
+        if target is None:
+            kept.append(i)
+        else:
+            if debug:
+                print(f"DEBUG: Merged category '{name}' into '{target}'")
+            for original, mapped in mapping.items():
+                if mapped == name:
+                    mapping[original] = target
+    return mapping
+
+def llm_clustering_sharded(records, api_url=API_URL, max_ctx=cluster_shard_ctx, debug=False):
+    # Map-reduce version of llm_clustering_batch for listings that exceed one context window.
+    # records: [{'id', 'title', 'keywords'}]. Shards run concurrently through the gateway;
+    # ids missing from a shard's answer are asked one by one with llm_clustering.
+    # Returns ({id: category} for every record, per-shard timings).
+    shards = shard_records(records, max_ctx)
+    pairs, timings = {}, []
+    with ThreadPoolExecutor(max_workers=llm_max_in_flight) as executor:
+        futures = [executor.submit(_run_shard, number, shard, api_url, max_ctx, debug) for number, shard in enumerate(shards)]
+        for future in futures:
+            shard_pairs, timing = future.result()
+            pairs.update(shard_pairs)
+            timings.append(timing)
+
+    missing = [record for record in records if record['id'] not in pairs]
+    if missing:
+        print(f"{len(missing)} articles missing from the shard answers, classifying them one by one...")
+        with ThreadPoolExecutor(max_workers=llm_max_in_flight) as executor:
+            answers = executor.map(lambda record: llm_clustering(record['title'], record['keywords'], api_url), missing)
+            for record, answer in zip(missing, answers):
+                pairs[record['id']] = answer.strip().split('\n', 1)[0].strip() or 'Others'
+
+    mapping = merge_categories(pairs.values(), api_url=api_url, debug=debug)
+    clusters = {record['id']: mapping[pairs[record['id']]] for record in records}
+    print(f"Clustered {len(records)} articles in {len(shards)} shards into {len(set(clusters.values()))} categories "
+          f"({len(set(pairs.values()))} before merging).")
+    return clusters, timings
 
 url_page_1 = 'https://www.doaj.org/toc/2096-0654/articles?source=%7B%22query%22%3A%7B%22bool%22%3A%7B%22must%22%3A%5B%7B%22terms%22%3A%7B%22index.issn.exact%22%3A%5B%222096-0654%22%5D%7D%7D%5D%7D%7D%2C%22size%22%3A%22200%22%2C%22sort%22%3A%5B%7B%22created_date%22%3A%7B%22order%22%3A%22desc%22%7D%7D%5D%2C%22_source%22%3A%7B%7D%2C%22track_total_hits%22%3Atrue%7D'
 url_page_2 = 'https://www.doaj.org/toc/2096-0654/articles?source=%7B%22query%22%3A%7B%22bool%22%3A%7B%22must%22%3A%5B%7B%22terms%22%3A%7B%22index.issn.exact%22%3A%5B%222096-0654%22%5D%7D%7D%5D%7D%7D%2C%22size%22%3A%22200%22%2C%22from%22%3A200%2C%22sort%22%3A%5B%7B%22created_date%22%3A%7B%22order%22%3A%22desc%22%7D%7D%5D%2C%22_source%22%3A%7B%7D%2C%22track_total_hits%22%3Atrue%7D'
 
-str_output = fetch_dynamic_content(url_page_1)
-json_output = json.loads(str_output)
-
-# Write the JSON output to a file
-with open('articles.json', 'w', encoding='utf-8') as json_file:
-    json.dump(json_output, json_file, indent=2, ensure_ascii=False)
-
-list_keywords = []
-for rec in tqdm(json_output[:100], desc="Extracting keywords"):
-    keywords = llm_keywords(rec['title'], rec['abstract'])
-    list_keywords.append({
-        'title': rec['title'],
-        'keywords': keywords,
-    })
-del rec
-
-print("Preparing Llama input")
-text = ""
-for rec in list_keywords:
-    text += f"Article ID: {generate_id(rec['title'])}\n"
-    text += f"Title: {rec['title']}\n"
-    text += f"Keywords: {rec['keywords']}\n"
-    text += "---\n"
-
-print("Batch extracting clusters")
-clusters = llm_clustering_batch(text)
-print(clusters)
-
-
-# =================================================
-
-json_slim = []
-for rec in json_output:
-    json_slim.append({
-        'title': rec['title'],
-        'keywords': rec['keywords']
-    })
-del rec
-# Write the JSON output to a file
-with open('articles_slim.json', 'w', encoding='utf-8') as json_file:
-    json.dump(json_slim, json_file, indent=2, ensure_ascii=False)
-del json_file
-
-
-idx = 1
-print(llm_keywords(json_output[idx]['title'], json_output[idx]['abstract']))
-
-keywords = llm_keywords(json_output[idx]['title'], json_output[idx]['abstract'])
-print(llm_clustering(json_output[idx]['title'], keywords))
+if __name__ == "__main__":
+    # articles are appended to the store as they are parsed; known ones are skipped
+    store = ArticleStore(article_store_path)
+    with ScraperSession(debug=True) as scraper:
+        added = known_run = 0
+        for article in scraper.iter_articles(url_page_1):
+            if store.add(article):
+                added, known_run = added + 1, 0
+            else:
+                known_run += 1
+                # results are sorted newest first, a page of known articles means the rest is known too
+                if known_run >= 200:
+                    break
+    print(f"{added} new articles, {len(store)} in {article_store_path}")
+
+    # Write the JSON output to a file (streamed from the store)
+    store.write_json('articles.json', ['title', 'keywords', 'abstract'])
+
+    # keyword_mode (configs.py) picks per-article LLM calls, batched LLM calls or embeddings
+    articles = list(store.project(['id', 'title', 'abstract']))
+    list_keywords = []
+    for rec, keywords in zip(articles, extract_keywords(articles)):
+        list_keywords.append({
+            'id': rec['id'],
+            'title': rec['title'],
+            'keywords': keywords,
+        })
+    del rec
+
+    # shards of cluster_shard_ctx tokens run concurrently, then similar category names are merged
+    print("Batch extracting clusters")
+    clusters, shard_timings = llm_clustering_sharded(list_keywords, debug=True)
+    for timing in shard_timings:
+        print(f"Shard {timing['shard']}: {timing['parsed']}/{timing['articles']} articles in {timing['seconds']:.1f}s")
+    for rec in list_keywords:
+        print(f"{rec['id']}|{clusters[rec['id']]}")
+
+
+    # =================================================
+
+    # Write the slim view (title + keywords) to a file, streamed from the store
+    store.write_json('articles_slim.json', ['title', 'keywords'])
+    store.close()
+
+
+    idx = 1
+    print(llm_keywords(articles[idx]['title'], articles[idx]['abstract']))
+
+    keywords = llm_keywords(articles[idx]['title'], articles[idx]['abstract'])
+    print(llm_clustering(articles[idx]['title'], keywords))
@@ -0,0 +1,132 @@
+# Append-only article store for the DOAJ scraper
+#
+# Articles are appended to a JSON Lines file (gzip compressed when the path
+# ends in .gz) as soon as they are parsed, one record per line, keyed by
+# generate_id(title). A crash only loses the record being written. The ids are
+# kept in a side file (<path>.ids) so a new crawl knows which articles it
+# already has without reading the store; the side file is rebuilt from the
+# store when it is missing or older than the store.
+#
+# Views such as the slim title + keywords list are streamed from the file
+# (project(), write_json()) instead of being built in memory.
+
+import gzip
+import hashlib
+import json
+import os
+
+
+# Function: Generate Article ID
+def generate_id(input_text):
+    result = hashlib.md5(input_text.encode()).hexdigest()
+    return result
+
+
+class ArticleStore:
+    def __init__(self, path='articles.jsonl'):
+        self.path = path
+        self.index_path = f'{path}.ids'
+        self.compressed = path.endswith('.gz')
+        self._file = None
+        self._index = None
+        self.ids = self._load_ids()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self, mode):
+        if self.compressed:
+            # appending adds a new gzip member, readers see one continuous stream
+            return gzip.open(self.path, mode + 't', encoding='utf-8')
+        return open(self.path, mode, encoding='utf-8')
+
+    def _load_ids(self):
+        if not os.path.exists(self.path):
+            return set()
+        if os.path.exists(self.index_path) and os.path.getmtime(self.index_path) >= os.path.getmtime(self.path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return {line.strip() for line in f if line.strip()}
+        # missing or stale index (e.g. a crash between the two writes): rebuild it from the store
+        ids = {record['id'] for record in self}
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            f.writelines(f'{id_}\n' for id_ in ids)
+        return ids
+
+    def __contains__(self, id_):
+        return id_ in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, article):
+        # append one {'title', ...} record; False if an article with that title is already stored
+        id_ = generate_id(article['title'])
+        if id_ in self.ids:
+            return False
+        if self._file is None:
+            self._file = self._open('a')
+            self._index = open(self.index_path, 'a', encoding='utf-8')
+            if not self.compressed and self._torn():
+                self._file.write('\n')
+        self._file.write(json.dumps({'id': id_, **article}, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._index.write(f'{id_}\n')
+        self._index.flush()
+        self.ids.add(id_)
+        return True
+
+    def _torn(self):
+        # the last write was interrupted, the file does not end with a newline
+        if os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+
+    def add_many(self, articles):
+        return sum(self.add(article) for article in articles)
+
+    def __iter__(self):
+        # stream every record from disk; a torn last line (crash mid-write) is skipped
+        if not os.path.exists(self.path):
+            return
+        # close the writer first, so a gzip member is complete; the next add() reopens it
+        self.close()
+        with self._open('r') as f:
+            try:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+            except EOFError:
+                # truncated gzip member, everything before it is still readable
+                return
+
+    def project(self, fields):
+        # lazy view holding only `fields` of every record, e.g. project(['title', 'keywords'])
+        for record in self:
+            yield {field: record.get(field) for field in fields}
+
+    def write_json(self, path, fields=None):
+        # stream the store (or a projection of it) into a regular JSON array file
+        records = self.project(fields) if fields else self
+        count = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for record in records:
+                f.write((',\n  ' if count else '\n  ') + json.dumps(record, ensure_ascii=False))
+                count += 1
+            f.write('\n]\n' if count else ']\n')
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+            # closing a gzip store writes its trailer; keep the index from looking stale
+            os.utime(self.index_path)
@@ -0,0 +1,197 @@
+# Staged pipeline for main.py: download -> extract -> summarize -> store
+#
+# Each stage runs in its own worker pool and hands work to the next one through
+# a bounded queue, so network, PDF parsing and LLM calls overlap instead of
+# adding up. The queues also apply back pressure: a slow model server stops the
+# downloaders once the buffers are full.
+
+import queue
+import threading
+import time
+import requests
+from   concurrent.futures import ProcessPoolExecutor
+from   funcs import *
+from   configs import *
+
+# Marks the end of the work for one worker
+_STOP = object()
+_stats_lock = threading.Lock()
+
+
+def _count(stats, key):
+    with _stats_lock:
+        stats[key] += 1
+
+
+def _start_workers(target, count, *args):
+    threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def _finish_stage(threads, next_queue, next_count):
+    # wait for a stage to drain, then tell every worker of the next stage to stop
+    for t in threads:
+        t.join()
+    for _ in range(next_count):
+        next_queue.put(_STOP)
+
+
+def _download_worker(session, versions, manifest, cache, in_q, out_q, stats):
+    while True:
+        url = in_q.get()
+        if url is _STOP:
+            return
+        # a worker that died would leave the next stage waiting: failed items are counted, not fatal
+        try:
+            _download_one(url, session, versions, manifest, cache, out_q, stats)
+        except requests.exceptions.RequestException as e:
+            print(f"Download failed for {url}: {e}")
+            _count(stats, 'failed')
+        except Exception as e:
+            print(f"Preparing {url} failed: {e}")
+            _count(stats, 'failed')
+
+
+def _download_one(url, session, versions, manifest, cache, out_q, stats):
+    # a cached text only stands for the current paper when its version is known; without
+    # one the PDF is downloaded and hashed first (see below)
+    if cache is not None and versions.get(url) is not None:
+        hit = cache.get(arxiv_id_from_url(url), versions.get(url))
+        if hit is not None:
+            text, hash_ = hit
+            if manifest is not None and is_unchanged(manifest.get(url), hash_=hash_):
+                _count(stats, 'unchanged')
+            else:
+                out_q.put((url, versions.get(url), hash_, None, text))
+            return
+
+    pdf_bytes = download_pdf(url, session)
+    hash_ = content_hash(pdf_bytes)
+    if manifest is not None and is_unchanged(manifest.get(url), hash_=hash_):
+        # version lookup missed it, but the PDF is the one we already summarized
+        _count(stats, 'unchanged')
+        return
+    if cache is not None and versions.get(url) is None:
+        # the newest cached text is reused only for the very same PDF, to skip extraction
+        hit = cache.get(arxiv_id_from_url(url))
+        if hit is not None and hit[1] == hash_:
+            out_q.put((url, None, hash_, None, hit[0]))
+            return
+    out_q.put((url, versions.get(url), hash_, pdf_bytes, None))
+
+
+def _extract_worker(executor, cache, in_q, out_q, write_q, stats):
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            return
+        try:
+            _extract_one(item, executor, cache, out_q, write_q, stats)
+        except Exception as e:
+            print(f"PDF extraction failed for {item[0]}: {e}")
+            _count(stats, 'failed')
+
+
+def _extract_one(item, executor, cache, out_q, write_q, stats):
+    url, version, hash_, pdf_bytes, arxiv_text = item
+    if arxiv_text is None:
+        arxiv_text = executor.submit(pdf_to_text, pdf_bytes).result()
+        if cache is not None:
+            cache.put(arxiv_id_from_url(url), version, arxiv_text, hash_, pdf_bytes)
+
+    payload_text = extract_abstract_section(arxiv_text)
+    if payload_text:
+        out_q.put((url, version, hash_, payload_text))
+    else:
+        print(f"Payload text invalid for {url}...")
+        _count(stats, 'skipped')
+        # still record it, so the same PDF is not fetched again next run
+        write_q.put((url, version, hash_, None, None))
+
+
+def _summarize_worker(api_url, in_q, out_q, stats):
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            return
+        url, version, hash_, payload_text = item
+        try:
+            summary = bot_response(build_summary_messages(payload_text), api_url)
+        except Exception as e:
+            print(f"Summarization failed for {url}: {e}")
+            _count(stats, 'failed')
+            continue
+        out_q.put((url, version, hash_, payload_text, summary))
+
+
+def _writer(db_name, in_q, stats, debug):
+    # SQLite connections are bound to their thread, so the writer owns its own
+    conn = init_db(db_name)
+    while True:
+        item = in_q.get()
+        if item is _STOP:
+            break
+        url, version, hash_, payload_text, summary = item
+        # the writer is the only consumer of its queue: a failed item is counted, not fatal
+        try:
+            if summary is not None:
+                save_summary_to_db(conn, url, payload_text, summary)
+            # the manifest is only updated once the summary is stored, so a failed paper is retried next run
+            update_manifest(conn, url, version, hash_)
+        except Exception as e:
+            print(f"Saving failed for {url}: {e}")
+            conn.rollback()
+            _count(stats, 'failed')
+            continue
+        if summary is not None:
+            _count(stats, 'saved')
+            if debug:
+                print(f"DEBUG: Saved summary for {url}:\n{summary}")
+    conn.close()
+
+
+def run_pipeline(urls, db_name=summary_db, api_url=api_url,
+                 n_download=download_workers, n_extract=extract_workers,
+                 n_llm=llm_concurrency, queue_size=pipeline_queue_size,
+                 versions=None, manifest=None, cache=None, session=None, debug=False):
+    # versions/manifest come from select_changed_urls() in incremental mode
+    versions = versions or {}
+    stats = {'saved': 0, 'skipped': 0, 'unchanged': 0, 'failed': 0}
+    start = time.perf_counter()
+
+    url_q = queue.Queue()
+    pdf_q = queue.Queue(maxsize=queue_size)
+    text_q = queue.Queue(maxsize=queue_size)
+    summary_q = queue.Queue(maxsize=queue_size)
+
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_maxsize=n_download)
+
+    with ProcessPoolExecutor(max_workers=n_extract) as executor:
+        downloaders = _start_workers(_download_worker, n_download, session, versions, manifest, cache, url_q, pdf_q, stats)
+        extractors = _start_workers(_extract_worker, n_extract, executor, cache, pdf_q, text_q, summary_q, stats)
+        summarizers = _start_workers(_summarize_worker, n_llm, api_url, text_q, summary_q, stats)
+        writer = _start_workers(_writer, 1, db_name, summary_q, stats, debug)
+
+        for url in urls:
+            url_q.put(url)
+        for _ in range(n_download):
+            url_q.put(_STOP)
+
+        _finish_stage(downloaders, pdf_q, n_extract)
+        _finish_stage(extractors, text_q, n_llm)
+        _finish_stage(summarizers, summary_q, 1)
+        _finish_stage(writer, None, 0)
+
+    if own_session:
+        session.close()
+    elapsed = time.perf_counter() - start
+    rate = stats['saved'] / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Pipeline finished in {elapsed:.1f}s: {stats['saved']} saved, {stats['skipped']} skipped, "
+          f"{stats['unchanged']} unchanged, {stats['failed']} failed ({rate:.1f} papers/min)")
+    if cache is not None:
+        print(f"Text cache: {cache.stats()}")
+    return stats
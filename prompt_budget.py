@@ -0,0 +1,103 @@
+# Token budgeting for prompts sent to Ollama
+#
+# Counts tokens with a fast local BPE tokenizer (tiktoken; pip install tiktoken),
+# caches the counts, trims or packs content to exactly the room left after the
+# prompt template and num_predict, and picks the smallest num_ctx from
+# num_ctx_ladder that fits, since a smaller KV cache is faster.
+#
+# Llama 3 uses a tiktoken-style BPE whose first 100k tokens match cl100k_base,
+# so counts are close but not exact; prompt_token_margin absorbs the difference.
+# Without tiktoken, counts fall back to ~4 characters per token.
+#
+# NOTE: Ollama reloads the model when num_ctx changes between requests, so the
+# ladder is kept coarse; set it to a single value to pin one context size.
+
+import math
+from   functools import lru_cache
+from   configs import *
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        # the encoding file is downloaded once, then read from tiktoken's cache
+        _encoding = tiktoken.get_encoding(prompt_tokenizer)
+    except Exception as e:
+        print(f"Tokenizer {prompt_tokenizer} unavailable ({type(e).__name__}), estimating token counts instead.")
+
+# Chat template tokens around every message (header ids, role, end of turn)
+MESSAGE_OVERHEAD = 5
+
+
+@lru_cache(maxsize=65536)
+def count_tokens(text):
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(messages):
+    return sum(count_tokens(message['content']) + MESSAGE_OVERHEAD for message in messages) + 1
+
+
+def with_margin(tokens):
+    return math.ceil(tokens * (1 + prompt_token_margin))
+
+
+def trim_to_tokens(text, max_tokens):
+    # longest prefix of text that is at most max_tokens long
+    if max_tokens <= 0:
+        return ''
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is None:
+        return text[:max_tokens * 4]
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def choose_num_ctx(prompt_tokens, num_predict, max_ctx=None):
+    # smallest ladder size holding prompt + answer; max_ctx (or the largest size) if nothing fits
+    needed = with_margin(prompt_tokens) + num_predict
+    ladder = [size for size in num_ctx_ladder if max_ctx is None or size <= max_ctx]
+    for size in ladder:
+        if size >= needed:
+            return size
+    return max_ctx or num_ctx_ladder[-1]
+
+
+def fits(prompt_tokens, num_predict, num_ctx):
+    return with_margin(prompt_tokens) + num_predict <= num_ctx
+
+
+def content_budget(template_tokens, num_predict, num_ctx):
+    # tokens left for content once the template, the answer and the margin are accounted for
+    return int((num_ctx - num_predict) / (1 + prompt_token_margin)) - template_tokens
+
+
+def fill_template(template, num_predict, max_ctx, **fields):
+    # Format `template` with the given fields, trimming only the longest field so the
+    # prompt fits max_ctx after num_predict. Returns (prompt, num_ctx).
+    empty = template.format(**{name: '' for name in fields})
+    longest = max(fields, key=lambda name: count_tokens(fields[name]))
+    fixed = count_tokens(empty) + sum(count_tokens(value) for name, value in fields.items() if name != longest)
+    budget = content_budget(fixed + MESSAGE_OVERHEAD + 1, num_predict, max_ctx)
+    fields = dict(fields, **{longest: trim_to_tokens(fields[longest], budget)})
+    prompt = template.format(**fields)
+    return prompt, choose_num_ctx(count_tokens(prompt) + MESSAGE_OVERHEAD + 1, num_predict, max_ctx)
+
+
+def pack_texts(texts, budget, separator=''):
+    # greedily take whole texts, in order, while they fit in `budget` tokens
+    packed, used = [], 0
+    sep_tokens = count_tokens(separator) if separator else 0
+    for text in texts:
+        cost = count_tokens(text) + (sep_tokens if packed else 0)
+        if used + cost > budget:
+            break
+        packed.append(text)
+        used += cost
+    return packed
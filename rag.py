@@ -1,54 +1,70 @@
 # Install required modules: pip install -U sentence-transformers faiss-cpu ollama
 # NOTE: faiss-gpu cannot be installed through pip on Windows. Use conda instead
 
+import argparse
+import json
 import os
+import threading
+import time
+from   concurrent.futures import ThreadPoolExecutor
+from   http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import faiss
-from   sentence_transformers import SentenceTransformer
-from   ollama import Client
-import re
+import numpy as np
+from   embeddings import EmbeddingCache, load_embedding_model
+from   llm_gateway import get_gateway
+from   prompt_budget import MESSAGE_OVERHEAD, content_budget, count_tokens, fill_template, pack_texts
+from   chunker import ChunkDeduper, iter_token_chunks
+from   chunk_store import ChunkStore, scan_files
+from   ann_index import IVF_TYPES, make_index, read_index, supports_removal, train_index, tune_index
+from   configs import *
 
-# Initialize the SentenceTransformer model for embeddings
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-
-# Initialize the Ollama client
+# The SentenceTransformer model (embeddings.load_embedding_model) and the Ollama client
+# (shared gateway, see llm_gateway.py) are created on first use, so importing this module is cheap
 # NOTE: Ollama is calling Docker ollama image, running on localhost:11434
-ollama_client = Client(host="http://localhost:11434")
 
 # Step 1: Load TXT files from the "data" folder
-def load_txt_files(folder_path, chunk_size=500, overlap=100, debug=False):
-    import re
+def iter_file_chunks(path, chunk_size=chunk_tokens, overlap=chunk_overlap_tokens):
+    # yields (start offset, part, text) for every chunk of one .txt file: sentence-aligned,
+    # at most chunk_size tokens, sentences worth up to overlap tokens repeated (see chunker.py)
+    return iter_token_chunks(path, chunk_size, overlap)
+
+def iter_chunks(folder_path, chunk_size=chunk_tokens, overlap=chunk_overlap_tokens, dedup=chunk_dedup, stats=None):
+    # yields (file, start offset, part, text) for every chunk of the files rag.py indexes
+    # (chunk_store.scan_files), without duplicates when dedup is on; pass a dict as stats
+    # to get the deduper's counts
+    deduper = ChunkDeduper() if dedup else None
+    for file in sorted(scan_files(folder_path)):
+        for start, part, text in iter_file_chunks(os.path.join(folder_path, file), chunk_size, overlap):
+            if deduper is not None:
+                kind, _, hash_, signature = deduper.check(text)
+                if kind:
+                    continue
+                deduper.add(deduper.stats['chunks'], hash_, signature)
+            yield file, start, part, text
+    if deduper is not None and stats is not None:
+        stats.update(deduper.stats)
+
+def load_txt_files(folder_path, chunk_size=chunk_tokens, overlap=chunk_overlap_tokens, debug=False):
     docs = []
     file_names = []
-
-    for file in os.listdir(folder_path):
-        if file.endswith(".txt"):
-            with open(os.path.join(folder_path, file), 'r', encoding='utf-8') as f:
-                raw_text = f.read()
-                # Split text into paragraphs for cleaner chunking
-                paragraphs = raw_text.split("\n\n")
-                for para in paragraphs:
-                    # Remove extra spaces and clean up
-                    cleaned_text = re.sub(r'\s+', ' ', para).strip()
-                    if len(cleaned_text) > 0:
-                        # Chunk paragraphs if they are too long
-                        chunks = [
-                            cleaned_text[i:i + chunk_size]
-                            for i in range(0, len(cleaned_text), chunk_size - overlap)
-                        ]
-                        docs.extend(chunks)
-                        file_names.extend([file] * len(chunks))
+    stats = {}
+    for file, _, _, text in iter_chunks(folder_path, chunk_size, overlap, stats=stats):
+        docs.append(text)
+        file_names.append(file)
     if debug:
-        print(f"DEBUG: Loaded {len(docs)} chunks from {len(file_names)} files.")
+        print(f"DEBUG: Loaded {len(docs)} chunks from {len(set(file_names))} files, deduplication: {stats}.")
     return docs, file_names
 
 # (Optional) Step 2: Generate embeddings and create FAISS index
-def create_faiss_index(documents, index_file="faiss_index.bin", debug=False):
-    embeddings = embedding_model.encode(documents, show_progress_bar=True)
-    dimension = embeddings.shape[1]
+def create_faiss_index(documents, index_file="faiss_index.bin", cache=None, debug=False):
+    # Embeddings come from (and go to) the on-disk embedding cache, see embeddings.py
+    cache = cache or EmbeddingCache()
+    rows = cache.embed(documents, debug=debug)
     
-    # Create FAISS index
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    # Create FAISS index (ann_index_type in configs.py), ids are the document positions
+    index = make_index(cache.dimension, ann_index_type, len(documents))
+    add_from_cache(index, cache, rows, np.arange(len(documents)))
+    tune_index(index)
     if debug:
         print(f"DEBUG: FAISS index contains {index.ntotal} vectors.")
     
@@ -56,12 +72,23 @@ def create_faiss_index(documents, index_file="faiss_index.bin", debug=False):
     faiss.write_index(index, index_file)
     if debug:
         print(f"FAISS index saved to {index_file}.")
-    return index, embeddings
+    # rows: where the document embeddings are in the cache
+    return index, rows
+
+def add_from_cache(index, cache, rows, ids):
+    # train on a random sample, then add block by block: the cache matrix is never loaded whole
+    if not index.is_trained:
+        sample = np.random.default_rng(0).choice(len(rows), min(len(rows), ann_train_size), replace=False)
+        train_index(index, cache.vectors(np.sort(rows[sample])))
+    ids = np.asarray(ids, dtype=np.int64)
+    for start, vectors in cache.iter_vectors(rows):
+        index.add_with_ids(vectors, ids[start:start + len(vectors)])
 
 # Step 2: Load FAISS index
-def load_faiss_index(index_file="faiss_index.bin"):
+def load_faiss_index(index_file="faiss_index.bin", mmap=False):
+    # mmap=True opens it read-only and memory-mapped (see ann_index.py)
     if os.path.exists(index_file):
-        index = faiss.read_index(index_file)
+        index = read_index(index_file, mmap)
         print(f"FAISS index loaded from {index_file}.")
         return index
     else:
@@ -70,22 +97,37 @@ def load_faiss_index(index_file="faiss_index.bin"):
 
 # Step 3: Retrieve relevant documents
 def retrieve_documents(query, index, documents, k=3, debug=False):
-    query_embedding = embedding_model.encode([query])
+    # documents: the chunk list the index was built from, or a ChunkStore
+    query_embedding = load_embedding_model().encode([query])
     distances, indices = index.search(query_embedding, k)
-    results = [documents[idx] for idx in indices[0]]
+    ids = [idx for idx in indices[0] if idx >= 0]
+    if isinstance(documents, ChunkStore):
+        results = documents.texts(ids)
+    else:
+        results = [documents[idx] for idx in ids]
     if debug:
         print(f"DEBUG: Retrieved Documents:\n{results}")
     return results
 
 # Step 4: Generate response using Ollama
+RAG_TEMPLATE = "Context:\n{context}\n\nQuery: {query}\n\nAnswer:"
+CONTEXT_SEPARATOR = "\n---\n"
+
 def generate_response_with_ollama(client, query, context, context_length=2048, num_predict=256, repeat_penalty=1.2, debug=False):
-    # Ensure the context is within the allowable length
-    context = context[:context_length] if len(context) > context_length else context
-    prompt = f"Context:\n{context}\n\nQuery: {query}\n\nAnswer:"
+    # context: a string, or the retrieved chunks best first; of those, as many whole chunks as fit
+    # are kept, so only a first chunk too long on its own gets cut
+    if not isinstance(context, str):
+        template_tokens = count_tokens(RAG_TEMPLATE.format(context='', query=query)) + MESSAGE_OVERHEAD + 1
+        packed = pack_texts(context, content_budget(template_tokens, num_predict, context_length), CONTEXT_SEPARATOR)
+        if debug and len(packed) < len(context):
+            print(f"DEBUG: {len(packed)} of {len(context)} retrieved chunks fit the context.")
+        context = CONTEXT_SEPARATOR.join(packed or context[:1])
+    # Ensure the prompt fits context_length tokens (not characters) next to the answer
+    prompt, num_ctx = fill_template(RAG_TEMPLATE, num_predict, context_length, context=context, query=query)
     if debug:
         print(f"DEBUG: Generated Prompt:\n{prompt}...")  # Print the first 500 characters of the prompt
     options = {
-        'num_ctx': context_length,
+        'num_ctx': num_ctx,
         'num_predict': num_predict,
         'repeat_penalty': repeat_penalty,
     }
@@ -95,34 +137,319 @@ def generate_response_with_ollama(client, query, context, context_length=2048, n
         return "No response generated."
     return response['response'].strip()
 
+# Keep the index and the chunk store in step with data/: only chunks of new or changed
+# files are embedded, vectors of changed or deleted files are removed by id
+def update_rag_index(data_folder="data", index_file="faiss_index.bin", store=None, chunk_size=chunk_tokens,
+                     overlap=chunk_overlap_tokens, full=False, debug=False):
+    store = store or ChunkStore()
+    settings = index_settings(chunk_size, overlap)
+    # start over when the saved index cannot be updated in place (other index type or
+    # chunking, written without this store, or not holding exactly its chunks)
+    index = None
+    rebuild = full or not os.path.exists(index_file)
+    if not rebuild:
+        index = load_faiss_index(index_file, mmap=ann_mmap)
+        rebuild = not store.is_consistent(index, None, settings, index_file, debug=debug)
+        if rebuild:
+            print("Index cannot be updated incrementally, rebuilding it.")
+    diff = None if rebuild else store.diff_files(data_folder)
+    if diff and (diff['removed'] or diff['modified']) and not supports_removal(ann_index_type):
+        print(f"{ann_index_type} indexes cannot remove vectors, rebuilding it.")
+        rebuild = True
+    if rebuild:
+        # the store is cleared in the same transaction that fills it again, so an interrupted
+        # rebuild leaves the old index and store as they were
+        index = None
+        diff = {'added': sorted(scan_files(data_folder)), 'removed': [], 'modified': []}
+
+    # nothing to do: serve the index opened above (memory-mapped when ann_mmap)
+    if not rebuild and not any(diff.values()):
+        if debug:
+            print(f"DEBUG: Index up to date ({index.ntotal} vectors).")
+        return index, store
+
+    if not rebuild and ann_mmap:
+        # the mapped index is read-only, load a copy to update
+        index = load_faiss_index(index_file)
+    try:
+        if rebuild:
+            store.clear()
+        before = dict(store.deduper.stats) if store.dedup else None
+
+        # files that dropped duplicates of removed chunks are re-chunked too, so their copies return
+        stale = []
+        removed = diff['removed'] + diff['modified']
+        rechunk = list(diff['modified'])
+        while removed:
+            ids = []
+            for file in removed:
+                ids.extend(store.remove_file(file))
+            stale.extend(ids)
+            removed = sorted(store.dependent_files(ids) - set(diff['removed']) - set(rechunk))
+            rechunk.extend(removed)
+        if stale:
+            index.remove_ids(np.array(stale, dtype=np.int64))
+
+        # embed all new chunks first, so a new IVF index can be trained on them; chunks embedded
+        # by an earlier build (same text) come from the embedding cache
+        ids, chunk_count = [], 0
+        for file in diff['added'] + rechunk:
+            chunks = list(iter_file_chunks(os.path.join(data_folder, file), chunk_size, overlap))
+            ids.extend(store.add_file(data_folder, file, chunks))
+            chunk_count += len(chunks)
+        texts = store.texts(ids) if ids else []
+        # an index built for few chunks (IVF cells, or a simpler type, see ann_index.py) is
+        # built again from all stored chunks once it holds ann_retrain_factor times as many
+        trained_on = len(ids) if index is None else store.get_meta('trained_on', index.ntotal)
+        cache = EmbeddingCache()
+        try:
+            rows = cache.embed(texts, debug=debug)
+            if index is None:
+                dimension = cache.dimension or load_embedding_model().get_sentence_embedding_dimension()
+                index = make_index(dimension, ann_index_type, len(ids))
+            if len(ids):
+                add_from_cache(index, cache, rows, ids)
+            if ann_retrain_factor and ann_index_type in IVF_TYPES and index.ntotal > ann_retrain_factor * trained_on:
+                print(f"Index grew from {trained_on} to {index.ntotal} chunks since it was built, rebuilding it.")
+                all_ids, all_texts = store.all_texts()
+                all_rows = cache.embed(all_texts, debug=debug)
+                index = make_index(index.d, ann_index_type, len(all_ids))
+                add_from_cache(index, cache, all_rows, all_ids)
+                trained_on = len(all_ids)
+        finally:
+            cache.close()
+        tune_index(index)
+
+        # write the new index next to the old one and swap it in, then commit the store
+        faiss.write_index(index, index_file + '.tmp')
+        os.replace(index_file + '.tmp', index_file)
+        store.mark_built(settings, index_file, trained_on)
+        store.conn.commit()
+    except BaseException:
+        store.rollback()
+        raise
+    print(f"Index updated: {len(diff['added'])} new, {len(diff['modified'])} changed, {len(diff['removed'])} deleted files; "
+          f"{len(ids)} chunks embedded, {len(stale)} removed, {index.ntotal} in total.")
+    # corpus reduction: papers indexed once, duplicate chunks never embedded
+    skipped = sum(file.endswith(".txt") for file in os.listdir(data_folder)) - len(scan_files(data_folder))
+    if store.dedup:
+        exact = store.deduper.stats['exact'] - before['exact']
+        near = store.deduper.stats['near'] - before['near']
+        share = (exact + near) / chunk_count if chunk_count else 0.0
+        print(f"Chunker: {len(ids)} of {chunk_count} chunks kept, {exact} exact and {near} near duplicates dropped "
+              f"({share:.1%} fewer to embed); {skipped} raw files skipped for their clean_ copies.")
+    elif skipped:
+        print(f"Chunker: {skipped} raw files skipped for their clean_ copies.")
+    return index, store
+
+# Build the index and the chunk store from scratch
+def build_rag_index(data_folder="data", index_file="faiss_index.bin", store=None, chunk_size=chunk_tokens,
+                    overlap=chunk_overlap_tokens, debug=False):
+    return update_rag_index(data_folder, index_file, store, chunk_size, overlap, full=True, debug=debug)
+
+def index_settings(chunk_size=chunk_tokens, overlap=chunk_overlap_tokens):
+    # a saved index is only updated in place while these stay the same
+    return {'chunker': 'tokens', 'chunk_size': chunk_size, 'overlap': overlap, 'prefer_clean': rag_prefer_clean,
+            'dedup': [chunk_dedup_threshold, minhash_perm, minhash_bands] if chunk_dedup else None,
+            'model': embedding_model_name, 'index_type': ann_index_type, 'nlist': ann_nlist, 'pq_m': ann_pq_m,
+            'hnsw_m': ann_hnsw_m}
+
+# Resident query engine: the embedding model, the index and the chunk store are loaded once,
+# on the first query, and kept. A batch of queries is embedded with one encode() call and
+# searched with one index.search(); answers are generated concurrently through the gateway.
+class RagEngine:
+    PHASES = ['embed', 'search', 'context', 'generate']
+
+    def __init__(self, data_folder="data", index_file="faiss_index.bin", client=None, k=5, chunk_size=chunk_tokens,
+                 overlap=chunk_overlap_tokens, update=True):
+        # update=False serves the saved index as it is, without checking data/ for changes
+        self.data_folder = data_folder
+        self.index_file = index_file
+        self.client = client
+        self.k = k
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.update = update
+        self.model = self.index = self.store = None
+        self.timings = {phase: [] for phase in self.PHASES}  # seconds per batch
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def load(self, full=False, debug=False):
+        with self._lock:
+            if self.index is None or full:
+                self.model = load_embedding_model()
+                if self.update or full:
+                    self.index, self.store = update_rag_index(self.data_folder, self.index_file, self.store,
+                                                              self.chunk_size, self.overlap, full=full, debug=debug)
+                else:
+                    self.index, self.store = load_faiss_index(self.index_file, mmap=ann_mmap), self.store or ChunkStore()
+                    # data/ is not checked, but the index must still be the one built with this store
+                    if self.index is None or not self.store.is_consistent(
+                            self.index, None, index_settings(self.chunk_size, self.overlap), self.index_file, debug):
+                        print("Saved index does not match the chunk store, updating it.")
+                        self.index, self.store = update_rag_index(self.data_folder, self.index_file, self.store,
+                                                                  self.chunk_size, self.overlap, debug=debug)
+                if self.client is None:
+                    self.client = get_gateway(api_url)
+        return self
+
+    def reload(self, full=False, debug=False):
+        # pick up changes in data/ (full=True rebuilds the index)
+        self.index = None
+        return self.load(full=full, debug=debug)
+
+    def retrieve(self, queries, k=None):
+        # [[chunk text]] and [[(file, start offset, part)]] per query, and the embed/search/context
+        # timings of the batch
+        self.load()
+        timings = {}
+        start = time.perf_counter()
+        embeddings = self.model.encode(list(queries), show_progress_bar=False)
+        timings['embed'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, indices = self.index.search(np.asarray(embeddings, dtype=np.float32), k or self.k)
+        timings['search'] = time.perf_counter() - start
+
+        # one store lookup for the whole batch
+        start = time.perf_counter()
+        ids = [[int(idx) for idx in row if idx >= 0] for row in indices]
+        unique_ids = sorted({idx for row in ids for idx in row})
+        texts = dict(zip(unique_ids, self.store.texts(unique_ids))) if unique_ids else {}
+        sources = dict(zip(unique_ids, self.store.sources(unique_ids))) if unique_ids else {}
+        documents = [[texts[idx] for idx in row] for row in ids]
+        timings['context'] = time.perf_counter() - start
+        return documents, [[sources[idx] for idx in row] for row in ids], timings
+
+    def answer(self, queries, k=None, generate=True, debug=False):
+        # [{'query', 'documents', 'sources', 'answer'}] in input order, and the per-phase timings of the batch
+        documents, sources, timings = self.retrieve(queries, k)
+        start = time.perf_counter()
+        if generate:
+            # the chunks are packed into each prompt by generate_response_with_ollama
+            with ThreadPoolExecutor(max_workers=llm_max_in_flight) as executor:
+                answers = list(executor.map(
+                    lambda args: generate_response_with_ollama(self.client, *args, debug=debug), zip(queries, documents)))
+        else:
+            answers = [None] * len(queries)
+        timings['generate'] = time.perf_counter() - start
+        with self._lock:
+            self.queries += len(queries)
+            for phase in self.PHASES:
+                self.timings[phase].append(timings[phase])
+        if debug:
+            print("DEBUG: " + ", ".join(f"{phase} {timings[phase] * 1000:.1f} ms" for phase in self.PHASES)
+                  + f" for {len(queries)} queries")
+        return [{'query': query, 'documents': docs, 'sources': srcs, 'answer': answer}
+                for query, docs, srcs, answer in zip(queries, documents, sources, answers)], timings
+
+    def latency_report(self):
+        # {phase: {'total', 'p50', 'p99'}} in seconds per batch, plus the number of queries served
+        report = {'queries': self.queries, 'batches': len(self.timings['embed'])}
+        for phase, values in self.timings.items():
+            if values:
+                report[phase] = {'total': sum(values), 'p50': float(np.percentile(values, 50)),
+                                 'p99': float(np.percentile(values, 99))}
+        return report
+
+_engines = {}
+
+def get_engine(data_folder="data", index_file="faiss_index.bin"):
+    # one engine per data folder and index file for the life of the process
+    if (data_folder, index_file) not in _engines:
+        _engines[(data_folder, index_file)] = RagEngine(data_folder, index_file)
+    return _engines[(data_folder, index_file)]
+
 # Main RAG system
-def rag_system(query, data_folder="data", client=ollama_client, k=3, recreate_index=False, debug=False):
-    # Load documents
-    documents, file_names = load_txt_files(data_folder, debug=debug)
-    
-    # Create or load FAISS index
-    if recreate_index:
-        index, _ = create_faiss_index(documents, debug=debug)
-    else:
-        index = load_faiss_index()
-        if index is None:
-            index, _ = create_faiss_index(documents, debug=debug)
-    
-    # Retrieve relevant documents
-    retrieved_docs = retrieve_documents(query, index, documents, k=5, debug=debug)
-    
-    # Combine retrieved documents as context
-    context = "\n---\n".join(retrieved_docs)
+def rag_system(query, data_folder="data", client=None, k=3, recreate_index=False, debug=False):
+    # The engine keeps the model, the index and the chunk store loaded between calls; data/ is
+    # checked for new or changed files on the first call (or get_engine().reload())
+    engine = get_engine(data_folder)
+    if client is not None:
+        engine.client = client
+    engine.load(full=recreate_index, debug=debug)
     
-    # Generate response
-    answer = generate_response_with_ollama(client, query, context, debug=debug)
-    
-    return answer
+    # Retrieve relevant documents, combine them as context and generate the response
+    (result,), _ = engine.answer([query], k=5, debug=debug)
+    if debug:
+        print(f"DEBUG: Retrieved Documents:\n{result['documents']}")
+    return result['answer']
+
+# HTTP front end for a resident engine:
+#   POST /query {"queries": [...], "k": 5, "generate": true} -> {"results": [...], "timings": {...}}
+#   GET /stats -> engine.latency_report()
+def serve(engine, host="127.0.0.1", port=rag_server_port, debug=False):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, engine.latency_report())
+            else:
+                self._reply(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            if self.path != '/query':
+                return self._reply(404, {'error': f'unknown path {self.path}'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                queries = request['queries']
+                if isinstance(queries, str):
+                    queries = [queries]
+            except (ValueError, KeyError, TypeError) as e:
+                return self._reply(400, {'error': f'expected {{"queries": [...]}}: {e}'})
+            k, generate = request.get('k'), request.get('generate', True)
+            if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+                return self._reply(400, {'error': 'queries must be a non-empty list of non-empty strings'})
+            # bool is an int too, so true is not taken for k=1
+            if k is not None and (isinstance(k, bool) or not isinstance(k, int) or k < 1):
+                return self._reply(400, {'error': f'k must be a positive integer, got {k!r}'})
+            if not isinstance(generate, bool):
+                return self._reply(400, {'error': f'generate must be true or false, got {generate!r}'})
+            try:
+                results, timings = engine.answer(queries, k, generate, debug=debug)
+            except Exception as e:
+                print(f"Query failed: {e}")
+                return self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+            self._reply(200, {'results': results, 'timings': timings})
+
+        def log_message(self, format, *args):
+            if debug:
+                super().log_message(format, *args)
+
+    engine.load(debug=debug)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"RAG engine serving {engine.index.ntotal} chunks on http://{host}:{server.server_address[1]}")
+    return server
 
 # Usage
 if __name__ == "__main__":
-    # Change to True whenever the corpus of documents in ./data changes
-    recreaate_index = False
-    query = "What is the general trend of research in these files?"
-    response = rag_system(query, recreate_index=recreaate_index, debug=True)
-    print("Response:", response)
+    parser = argparse.ArgumentParser(description="Answer questions about the papers in ./data")
+    parser.add_argument('queries', nargs='*', default=["What is the general trend of research in these files?"])
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the index from scratch')
+    parser.add_argument('--serve', action='store_true', help='keep the engine loaded and answer over HTTP')
+    parser.add_argument('--port', type=int, default=rag_server_port)
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+
+    # The index follows ./data incrementally; --rebuild starts from scratch
+    engine = get_engine().load(full=args.rebuild, debug=args.debug)
+    if args.serve:
+        server = serve(engine, port=args.port, debug=args.debug)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+    else:
+        results, _ = engine.answer(args.queries, debug=args.debug)
+        for result in results:
+            print("Query:", result['query'])
+            print("Response:", result['answer'])
+        print(json.dumps(engine.latency_report(), indent=2))
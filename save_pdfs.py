@@ -1,55 +1,180 @@
 import os
 import re
-from   arxiv2text import arxiv_to_text
+import json
+import hashlib
+from   concurrent.futures import ProcessPoolExecutor, as_completed
 from   funcs import *
+from   text_cache import TextCache, cached_arxiv_text
+from   sections import load_sections, save_sections
 from   tqdm import tqdm
 
 # Specify the data path
 data_path = os.path.join(os.getcwd(), "data")
 
-# Check if the folder exists
-if not os.path.exists(data_path):
-    # Create the folder (including intermediate directories if necessary)
-    os.makedirs(data_path)
-    print(f"Folder created: {data_path}")
-else:
-    print(f"Folder already exists: {data_path}")
-
 article_main_url = "https://arxiv.org/list/cs.AI/recent"
 
-test_urls = get_arxiv_pdf_links(article_main_url)
+# Outputs of clean_text() and the record of what has been cleaned already
+CLEAN_PREFIX = 'clean_'
+CLEAN_MANIFEST = '.clean_manifest.json'
+# Bump when clean_text() output changes, to re-clean everything once
+CLEAN_VERSION = 2
+
+# Placeholders for images, tables, or figures (applied after whitespace is collapsed)
+PLACEHOLDER_RE = re.compile(r'(Figure\s*\d+:|Table\s*\d+:|refer to Figure\s*\d+)')
+WHITESPACE_RE = re.compile(r'\s+')
 
-for url in tqdm(test_urls, desc="Extracting PDFs into TXT"):
-    #print(f"Processing URL: {url}")
-    arxiv_text = arxiv_to_text(url)
-    filename = os.path.join(data_path, url.split('/')[-1] + '.txt')
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(arxiv_text)
+# Cleaned text is written in blocks of about this many characters
+CLEAN_BLOCK_SIZE = 1 << 20
 
-def clean_text(input_path, output_path):
-    with open(input_path, 'r', encoding='utf-8') as file:
-        text = file.read()
 
-    # Step 1: Remove placeholders for images, tables, or figures
-    text = re.sub(r'(Figure\s*\d+:|Table\s*\d+:|refer to Figure\s*\d+)', '', text)
+def save_listing_texts(urls, data_path):
+    # shared with main.py, so papers it already parsed are not downloaded again
+    cache = TextCache()
+    versions = get_arxiv_versions([arxiv_id_from_url(url) for url in urls])
+    for url in tqdm(urls, desc="Extracting PDFs into TXT"):
+        #print(f"Processing URL: {url}")
+        arxiv_text, _ = cached_arxiv_text(url, cache, versions.get(arxiv_id_from_url(url)))
+        filename = os.path.join(data_path, url.split('/')[-1] + '.txt')
+        # leave unchanged files alone, so the cleaner can skip them by mtime
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding='utf-8') as f:
+                if f.read() == arxiv_text:
+                    load_sections(filename, arxiv_text)
+                    continue
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(arxiv_text)
+        # parse the structure while the text is in memory, for the cleaner
+        save_sections(filename, arxiv_text)
+    print(f"Text cache: {cache.stats()}")
 
-    # Step 2: Merge broken lines
-    # Replace line breaks that are not followed by another line break
-    text = re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
 
-    # Step 3: Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+def _safe_cut(buffer):
+    # a space well before the end of the buffer that no placeholder match spans,
+    # so the block before it can be cleaned on its own (placeholders are < 64 chars)
+    cut = buffer.rfind(' ', 0, max(len(buffer) - 64, 0))
+    for match in reversed(list(PLACEHOLDER_RE.finditer(buffer))):
+        if cut <= 0 or match.end() <= cut:
+            break
+        if match.start() < cut:
+            cut = buffer.rfind(' ', 0, match.start())
+    return cut
 
-    # Step 4: Preserve section breaks
-    # Replace multiple line breaks with two line breaks for readability
-    text = re.sub(r'\n\s*\n', '\n\n', text)
 
-    # Step 5: Write the cleaned text to a new file
-    with open(output_path, 'w', encoding='utf-8') as file:
-        file.write(text)
+def clean_text(input_path, output_path, stop_at=None):
+    # Same result as the original four regex passes (placeholders removed, lines merged,
+    # whitespace collapsed), but streamed: every line is collapsed as it is read and
+    # placeholders are removed per block, keeping a short tail so a match is never split.
+    # Only difference: "refer to Figure N" is now also removed when its words were split across lines.
+    # Reading stops at character offset stop_at (the references section, see sections.py).
+    tmp_path = output_path + '.tmp'
+    with open(input_path, 'r', encoding='utf-8') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+        buffer = ''
+        first = True
+        position = 0
+        for line in src:
+            if stop_at is not None and position >= stop_at:
+                break
+            position += len(line)
+            words = WHITESPACE_RE.sub(' ', line).strip()
+            if not words:
+                continue
+            buffer = f'{buffer} {words}' if buffer else words
+            if len(buffer) < CLEAN_BLOCK_SIZE:
+                continue
+            cut = _safe_cut(buffer)
+            if cut <= 0:
+                continue
+            head = WHITESPACE_RE.sub(' ', PLACEHOLDER_RE.sub('', buffer[:cut])).strip()
+            buffer = buffer[cut + 1:]
+            if head:
+                dst.write(head if first else ' ' + head)
+                first = False
 
+        tail = WHITESPACE_RE.sub(' ', PLACEHOLDER_RE.sub('', buffer)).strip()
+        if tail:
+            dst.write(tail if first else ' ' + tail)
+    os.replace(tmp_path, output_path)
     return output_path
 
-for file in os.listdir(data_path):
-    if file.endswith(".txt"):
-        clean_text(os.path.join(data_path, file), os.path.join(data_path, 'clean_'+file))
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CLEAN_BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _clean_if_changed(file, data_path, previous):
+    # runs in a worker process; returns the manifest entry for `file`, or None if it was up to date
+    input_path = os.path.join(data_path, file)
+    output_path = os.path.join(data_path, CLEAN_PREFIX + file)
+    stat = os.stat(input_path)
+    if previous and previous.get('version') == CLEAN_VERSION and os.path.exists(output_path):
+        if previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+            return None
+        # touched but not modified: just refresh the recorded mtime
+        hash_ = file_hash(input_path)
+        if previous['hash'] == hash_:
+            return {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': hash_, 'version': CLEAN_VERSION, 'cleaned': False}
+    else:
+        hash_ = file_hash(input_path)
+
+    # the bibliography is noise for retrieval, drop it
+    references = load_sections(input_path)['references']
+    clean_text(input_path, output_path, references['start'] if references else None)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': hash_, 'version': CLEAN_VERSION, 'cleaned': True}
+
+
+def clean_corpus(data_path, workers=None, debug=False):
+    manifest_path = os.path.join(data_path, CLEAN_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    files = []
+    for file in os.listdir(data_path):
+        if not file.endswith(".txt"):
+            continue
+        if file.startswith(CLEAN_PREFIX + CLEAN_PREFIX):
+            # left over from runs that used to re-clean their own outputs
+            os.remove(os.path.join(data_path, file))
+            continue
+        if not file.startswith(CLEAN_PREFIX):
+            files.append(file)
+
+    cleaned = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_clean_if_changed, file, data_path, manifest.get(file)): file for file in files}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Cleaning TXT"):
+            entry = future.result()
+            if entry is None:
+                continue
+            cleaned += entry.pop('cleaned')
+            manifest[futures[future]] = entry
+
+    # forget files that were removed from data/
+    present = set(files)
+    manifest = {file: entry for file, entry in manifest.items() if file in present}
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    if debug:
+        print(f"DEBUG: Cleaned {cleaned} of {len(files)} files, {len(files) - cleaned} unchanged.")
+    return cleaned
+
+
+if __name__ == "__main__":
+    # Check if the folder exists
+    if not os.path.exists(data_path):
+        # Create the folder (including intermediate directories if necessary)
+        os.makedirs(data_path)
+        print(f"Folder created: {data_path}")
+    else:
+        print(f"Folder already exists: {data_path}")
+
+    test_urls = get_arxiv_pdf_links(article_main_url)
+    save_listing_texts(test_urls, data_path)
+    clean_corpus(data_path, debug=True)
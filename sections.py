@@ -0,0 +1,142 @@
+# Single-pass parser for the plain text that pdfminer extracts from a paper
+#
+# parse_sections() walks the text line by line once and returns:
+#   title       first paragraph of the paper (arXiv stamp lines skipped)
+#   abstract    text after the "Abstract" heading, up to the next blank line
+#   sections    [{'heading', 'start', 'end'}], offsets into the text
+#   paragraphs  [[start, end]] of every blank-line separated block
+#   references  {'start', 'entries'} of the bibliography, or None
+#
+# Offsets are character offsets into the text as read with open(..., 'r'), so
+# consumers can slice the text (or count characters while streaming) directly.
+# The result is cached as <paper>.sections.json next to the .txt file.
+
+import json
+import os
+import re
+
+# "3 Method", "3.2. Results", "IV. EXPERIMENTS"
+NUMBERED_HEADING_RE = re.compile(r'^(?:\d+(?:\.\d+)*\.?|[IVX]+\.)\s+([A-Z][^.!?]{1,80})$')
+NAMED_HEADING_RE = re.compile(
+    r'^(?:introduction|related work|background|method(?:s|ology)?|experiments?|results|discussion|'
+    r'conclusions?|limitations|acknowledge?ments?|appendix|references|bibliography)$',
+    re.IGNORECASE)
+REFERENCES_RE = re.compile(r'^(?:\d+\.?\s+)?(?:references|bibliography)$', re.IGNORECASE)
+REFERENCE_ENTRY_RE = re.compile(r'^\[\d+\]')
+ABSTRACT_RE = re.compile(r'^abstract\b[\s:.\-—–]*', re.IGNORECASE)
+
+
+def _heading(line):
+    if len(line) > 90:
+        return None
+    if NAMED_HEADING_RE.match(line):
+        return line
+    match = NUMBERED_HEADING_RE.match(line)
+    if match and len(match.group(1).split()) <= 12:
+        return line
+    return None
+
+
+def parse_sections(text):
+    title_lines = []
+    abstract_lines = []
+    sections = []
+    paragraphs = []
+    references = None
+
+    state = 'title'
+    para_start = None
+    offset = 0
+    for raw_line in text.splitlines(keepends=True):
+        start = offset
+        offset += len(raw_line)
+        line = raw_line.strip()
+
+        if not line:
+            if para_start is not None:
+                paragraphs.append([para_start, start])
+                para_start = None
+            if state == 'title' and title_lines:
+                state = 'front'
+            elif state == 'abstract' and abstract_lines:
+                state = 'body'
+            continue
+        if para_start is None:
+            para_start = start
+
+        if state in ('title', 'front') and ABSTRACT_RE.match(line):
+            state = 'abstract'
+            rest = ABSTRACT_RE.sub('', line, count=1)
+            if rest:
+                abstract_lines.append(rest)
+            continue
+        if state == 'title':
+            if not line.startswith('arXiv:'):
+                title_lines.append(line)
+            continue
+        if state == 'abstract':
+            abstract_lines.append(line)
+            continue
+
+        if state != 'references':
+            heading = _heading(line)
+            if heading:
+                if sections:
+                    sections[-1]['end'] = start
+                sections.append({'heading': heading, 'start': start, 'end': None})
+                if REFERENCES_RE.match(heading):
+                    state = 'references'
+                    references = {'start': start, 'entries': []}
+                continue
+        else:
+            entries = references['entries']
+            # a new entry starts with "[n]" or after a blank line
+            if not entries or REFERENCE_ENTRY_RE.match(line) or para_start == start:
+                entries.append(line)
+            else:
+                entries[-1] = f'{entries[-1]} {line}'
+
+    if para_start is not None:
+        paragraphs.append([para_start, offset])
+    if sections:
+        sections[-1]['end'] = offset
+
+    return {
+        'title': ' '.join(title_lines),
+        'abstract': ' '.join(abstract_lines),
+        'sections': sections,
+        'paragraphs': paragraphs,
+        'references': references,
+    }
+
+
+def sections_path(txt_path):
+    return os.path.splitext(txt_path)[0] + '.sections.json'
+
+
+def save_sections(txt_path, text):
+    # parse `text` (the content of txt_path) and cache the result next to it
+    doc = parse_sections(text)
+    stat = os.stat(txt_path)
+    doc['source'] = {'mtime': stat.st_mtime, 'size': stat.st_size}
+    with open(sections_path(txt_path) + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(doc, f)
+    os.replace(sections_path(txt_path) + '.tmp', sections_path(txt_path))
+    return doc
+
+
+def load_sections(txt_path, text=None):
+    # cached structure of txt_path, re-parsed only when the .txt changed
+    stat = os.stat(txt_path)
+    try:
+        with open(sections_path(txt_path), 'r', encoding='utf-8') as f:
+            doc = json.load(f)
+        if doc.get('source') == {'mtime': stat.st_mtime, 'size': stat.st_size}:
+            return doc
+    except (OSError, ValueError):
+        pass
+
+    if text is None:
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    return save_sections(txt_path, text)
@@ -0,0 +1,123 @@
+# Shared cache of extracted paper text, keyed by arXiv id and version
+#
+# main.py, pipeline.py and save_pdfs.py all read papers through this store, so a
+# given arXiv version is downloaded and PDF-parsed at most once. Text (and
+# optionally the raw PDF) is zlib-compressed in one SQLite file, the total size
+# is capped and the least recently used entries are evicted first.
+
+import sqlite3
+import threading
+import time
+import zlib
+from   funcs import arxiv_id_from_url, content_hash, download_pdf, pdf_to_text
+from   configs import *
+
+
+class TextCache:
+    def __init__(self, db_name=text_cache_db, max_bytes=text_cache_max_mb * 1024 * 1024, store_pdf=text_cache_store_pdf):
+        self.max_bytes = max_bytes
+        self.store_pdf = store_pdf
+        self.hits = 0
+        self.misses = 0
+        # one connection shared by the pipeline threads, serialised by the lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_name, timeout=30, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS texts (
+                arxiv_id TEXT,
+                version INTEGER,
+                text BLOB,
+                pdf BLOB,
+                pdf_hash TEXT,
+                size INTEGER,
+                last_access REAL,
+                PRIMARY KEY (arxiv_id, version)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS texts_last_access ON texts (last_access)')
+        self._conn.commit()
+
+    def get(self, arxiv_id, version=None):
+        # returns (text, pdf_hash) or None; without a version the newest cached one is used, which
+        # may be older than the paper online: compare pdf_hash with the downloaded PDF before using it
+        with self._lock:
+            if version is None:
+                row = self._conn.execute(
+                    'SELECT version, text, pdf_hash FROM texts WHERE arxiv_id = ? ORDER BY version DESC LIMIT 1',
+                    (arxiv_id,)).fetchone()
+            else:
+                row = self._conn.execute(
+                    'SELECT version, text, pdf_hash FROM texts WHERE arxiv_id = ? AND version = ?',
+                    (arxiv_id, version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute('UPDATE texts SET last_access = ? WHERE arxiv_id = ? AND version = ?',
+                               (time.time(), arxiv_id, row[0]))
+            self._conn.commit()
+        return zlib.decompress(row[1]).decode('utf-8'), row[2]
+
+    def get_pdf(self, arxiv_id, version):
+        with self._lock:
+            row = self._conn.execute('SELECT pdf FROM texts WHERE arxiv_id = ? AND version = ?',
+                                     (arxiv_id, version)).fetchone()
+        return zlib.decompress(row[0]) if row and row[0] else None
+
+    def put(self, arxiv_id, version, text, pdf_hash=None, pdf_bytes=None):
+        # unknown versions are stored as 0 so they never shadow a real version
+        text_blob = zlib.compress(text.encode('utf-8'))
+        pdf_blob = zlib.compress(pdf_bytes) if self.store_pdf and pdf_bytes else None
+        size = len(text_blob) + (len(pdf_blob) if pdf_blob else 0)
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO texts (arxiv_id, version, text, pdf, pdf_hash, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (arxiv_id, version or 0, text_blob, pdf_blob, pdf_hash, size, time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM texts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute('SELECT arxiv_id, version, size FROM texts ORDER BY last_access').fetchall()
+        for arxiv_id, version, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM texts WHERE arxiv_id = ? AND version = ?', (arxiv_id, version))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM texts').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': total,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def cached_arxiv_text(url, cache, version=None, session=None):
+    # drop-in for arxiv_to_text(url) that goes through the cache; returns (text, pdf_hash)
+    arxiv_id = arxiv_id_from_url(url)
+    if version is not None:
+        hit = cache.get(arxiv_id, version)
+        if hit is not None:
+            return hit
+    pdf_bytes = download_pdf(url, session)
+    hash_ = content_hash(pdf_bytes)
+    if version is None:
+        # unknown version: the cached text is only used if it came from this very PDF
+        hit = cache.get(arxiv_id)
+        if hit is not None and hit[1] == hash_:
+            return hit
+    text = pdf_to_text(pdf_bytes)
+    cache.put(arxiv_id, version, text, hash_, pdf_bytes)
+    return text, hash_